@@ -1,20 +1,34 @@
 __version__ = "2.1.0"
 
+# Needs to come before any module that defines numba kernels
+from .numba_cache import *
+
 from .common import *
 from .rundb import *
+from . import run_catalog
+from .run_catalog import *
 from .logging_utils import *
 
+from . import itp_map
+from .itp_map import *
+
 from . import xams_config
 from .xams_config import *
 
 from . import corrections_services
 from .corrections_services import *
 
+from . import corrections_table
+from .corrections_table import *
+
 from . import plugins
 from .plugins import *
 
 from . import contexts
 
+from . import columnar
+from .columnar import *
+
 from . import hitfinder_thresholds
 from .hitfinder_thresholds import *
 
@@ -29,5 +43,8 @@ from .config import *
 
 from . import analyses
 
+from . import numba_warmup
+from .numba_warmup import *
+
 from . import auto_processing_new
 from .auto_processing_new import *
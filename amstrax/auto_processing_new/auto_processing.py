@@ -4,11 +4,10 @@ import os
 import logging
 from datetime import datetime, timedelta
 
-from job_submission import submit_job
-from db_utils import update_processing_status
+from job_submission import submit_job, CondorJobState
+from db_utils import update_processing_status, flush_writes
 
 
-import subprocess
 import sys
 from datetime import datetime, timedelta
 
@@ -17,6 +16,8 @@ logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
 SETUP_FILE = "/data/xenon/xams_v2/setup.sh"
+# Hosts of the processed data in the rundb
+PROCESSED_HOSTS = ["stbc", "wn"]
 
 def parse_args():
     """
@@ -56,20 +57,22 @@ def main(args):
     nap_time = int(args.timeout)
     output_folder = args.output_folder
     targets = " ".join(args.target)
-    runs_col = amstrax.get_mongo_collection()
-
-    client = amstrax.get_mongo_client()
-    processing_db = client["daq"]["processing"]
 
     while True:
+        # Look up the collections every cycle, the client is replaced
+        # when the SSH tunnel is reconnected
+        runs_col = amstrax.get_mongo_collection()
+        processing_db = amstrax.get_mongo_client()["daq"]["processing"]
+
         # Check if auto-processing is enabled
         auto_processing_on = processing_db.find_one({"name": "auto_processing"})["status"] == "on"
 
         # Update task list and check for new runs
         run_docs_to_do = update_task_list(args, runs_col, auto_processing_on)
 
-        # Handle running jobs
-        handle_running_jobs(runs_col, production=args.production)
+        # Handle running jobs, with one look at the condor queue per cycle
+        handle_running_jobs(runs_col, CondorJobState(), production=args.production)
+        flush_writes()
 
         if not run_docs_to_do:
             log.info(f"No runs to process. Sleeping for {nap_time} seconds.")
@@ -78,6 +81,7 @@ def main(args):
 
         # Submit new jobs if below max limit
         submit_new_jobs(args, runs_col, run_docs_to_do, amstrax_dir)
+        flush_writes()
 
         if args.run_id:
             log.info("Finished processing run.")
@@ -95,9 +99,6 @@ def update_task_list(args, runs_col, auto_processing_on):
         "data": {"$elemMatch": {"type": "live", "host": "stbc"}},
         "$or": [
             {
-                "data": {"$not": {"$elemMatch": {
-                    "host": {"$in": ["stbc", "wn"]}, 
-                    "type": "raw_records"}}},
                 "processing_failed": {"$not": {"$gt": args.n_failures_max}},
                 "processing_status.status": {"$not": {"$in": ["running", "submitted"]}},
                 "tags": {"$not": {"$elemMatch": {"name": "abandon"}}},
@@ -111,9 +112,18 @@ def update_task_list(args, runs_col, auto_processing_on):
     if not auto_processing_on:
         query = {"data": {"$elemMatch": {"type": "live", "host": "stbc"}}, "tags": {"$elemMatch": {"name": "process"}}}
 
-    projection = {"number": 1, "start": 1, "end": 1, "data": 1, "processing_status": 1, "processing_failed": 1}
+    projection = {"number": 1, "start": 1, "end": 1, "tags": 1, "processing_status": 1, "processing_failed": 1}
     sort = [("number", -1)]
-    run_docs_to_do = list(runs_col.find(query, projection).sort(sort))
+    run_docs = list(runs_col.find(query, projection).sort(sort))
+
+    # Which runs already have raw_records, for all runs in one query
+    available, _ = amstrax.availability_matrix(
+        runs_col, [run_doc["number"] for run_doc in run_docs], ["raw_records"], hosts=PROCESSED_HOSTS)
+    run_docs_to_do = [
+        run_doc for run_doc in run_docs
+        if not available.loc[run_doc["number"], "raw_records"]
+        or any(tag.get("name") == "process" for tag in run_doc.get("tags", []))
+    ]
 
     if args.run_id:
         run_docs_to_do = [runs_col.find_one({"number": int(args.run_id)}, projection)]
@@ -124,29 +134,17 @@ def update_task_list(args, runs_col, auto_processing_on):
 
 
 
-def is_job_running_in_condor(run_number):
-    """
-    Check if a job with the given run_number exists in condor_q (not completed).
-    """
-    try:
-        result = subprocess.run(['condor_q', '-nobatch'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        if result.returncode != 0:
-            raise RuntimeError(f"condor_q command failed: {result.stderr}")
-
-        for line in result.stdout.splitlines():
-            if str(run_number) in line:  # C = completed
-                return True
-        return False
+def online_job_name(run_id):
+    return f"process_{int(run_id):06}_online"
 
-    except Exception as e:
-        log.error(f"Error checking condor for run {run_number}: {e}")
-        return True  # Fail-safe: assume running to avoid false marking as failed
 
-def handle_running_jobs(runs_col, production=False):
+def handle_running_jobs(runs_col, job_state, production=False):
     """
     Check and update the status of running jobs. Mark jobs as failed if:
     - They've been running or submitted for over 30 minutes, OR
     - Their status is 'submitted'/'running' but no such job exists in condor.
+
+    :param job_state: CondorJobState of this cycle
     """
     query = {"processing_status.status": {"$in": ["submitted", "running"]}}
     projection = {"number": 1, "processing_status": 1}
@@ -165,7 +163,7 @@ def handle_running_jobs(runs_col, production=False):
             should_fail = True
 
         # Check with condor if job is missing
-        if not is_job_running_in_condor(run_number):
+        if not job_state.is_active(online_job_name(run_number)):
             log.info(f"No condor job found for run {run_number} marked as {processing_status['status']}.")
             should_fail = True
 
@@ -198,7 +196,7 @@ def submit_new_jobs(args, runs_col, run_docs_to_do, amstrax_dir):
 
     for run_doc in run_docs_to_do[:max_jobs_to_submit]:
         run_id = f'{int(run_doc["number"]):06}'
-        job_name = f"process_{run_id}_online"
+        job_name = online_job_name(run_id)
 
         production_flag = "--production" if args.production else ""
         targets = " ".join(args.target)
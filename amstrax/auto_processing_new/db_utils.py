@@ -1,17 +1,160 @@
 # db_interaction.py
-from pymongo import MongoClient
+import atexit
 import datetime
 import logging
+import threading
+import pymongo
 import amstrax
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
-# Create a MongoDB client and connect to the rundb collection
+def get_runsdb():
+    """
+    The rundb collection. Look it up for each use rather than keeping it:
+    the client behind it is shared, but it is replaced when the SSH tunnel
+    is reconnected (see amstrax.get_mongo_client).
+    """
+    return amstrax.get_mongo_collection()
+
+
+class RunDBWriter:
+    """
+    Write-behind queue for the updates of the processing scripts.
+
+    Status updates are coalesced per run: the last status wins, the failure
+    counts add up. Data entries are added with a conditional $push, which
+    skips entries that are already there, so no document has to be read
+    first. Everything is sent as a single unordered bulk_write when flushed:
+    explicitly, when max_pending updates are queued, max_delay seconds after
+    the oldest update was queued (by a timer), and at exit.
+
+    Updates stay queued until they are written: if the write fails, e.g.
+    because the rundb cannot be reached, they are tried again with the next
+    flush. Errors are logged, not raised, so queueing an update never fails.
+    """
+
+    def __init__(self, collection=None, max_pending=100, max_delay=30):
+        self._collection = collection
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        # run number: dict($set=..., $inc=..., $pull=...)
+        self.statuses = dict()
+        # [(run number, data entry)]
+        self.data_entries = []
+        self._timer = None
+        self._lock = threading.Lock()
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            return get_runsdb()
+        return self._collection
+
+    @property
+    def n_pending(self):
+        return len(self.statuses) + len(self.data_entries)
+
+    def queue_status(self, run_id, update, increase=None, pull=None):
+        with self._lock:
+            status = self.statuses.setdefault(int(run_id), {'$set': {}, '$inc': {}, '$pull': {}})
+            status['$set']['processing_status'] = update
+            for field, n in (increase or {}).items():
+                status['$inc'][field] = status['$inc'].get(field, 0) + n
+            status['$pull'].update(pull or {})
+            self._queued()
+
+    def queue_data_entry(self, run_id, data_entry):
+        with self._lock:
+            self.data_entries.append((int(run_id), data_entry))
+            self._queued()
+
+    def _queued(self):
+        if self.n_pending >= self.max_pending:
+            self._flush()
+        else:
+            self._start_timer()
+
+    def _start_timer(self):
+        """Flush in max_delay seconds, unless a flush is due already"""
+        if self._timer is None and self.n_pending:
+            self._timer = threading.Timer(self.max_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Send all queued updates, returns the number of updates written"""
+        with self._lock:
+            return self._flush()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
 
-def update_processing_status(run_id, status, reason=None, host='stbc', production=False, pull=dict(), is_online=False):
+        statuses = list(self.statuses.items())
+        operations = []
+        for number, status in statuses:
+            operations.append(pymongo.UpdateOne(
+                {'number': number},
+                # Leave out empty operators, older MongoDB versions refuse them
+                {operator: fields for operator, fields in status.items() if fields}))
+        for number, data_entry in self.data_entries:
+            operations.append(pymongo.UpdateOne(
+                {'number': number,
+                 'data': {'$not': {'$elemMatch': {
+                     'type': data_entry['type'],
+                     'location': data_entry['location'],
+                     'lineage_hash': data_entry['lineage_hash']}}}},
+                {'$push': {'data': data_entry}}))
+        if not operations:
+            return 0
+
+        failed = set()
+        try:
+            result = self.collection.bulk_write(operations, ordered=False)
+            log.info(f"Wrote {len(operations)} updates to the rundb "
+                     f"({result.modified_count} documents modified).")
+        except pymongo.errors.BulkWriteError as e:
+            failed = set(error['index'] for error in e.details['writeErrors'])
+            log.error(f"Failed to write {len(failed)} of {len(operations)} "
+                      f"updates to the rundb, will retry: {e.details['writeErrors']}")
+        except pymongo.errors.PyMongoError as e:
+            failed = set(range(len(operations)))
+            log.error(f"Failed to write {len(operations)} updates to the rundb, will retry: {e}")
+
+        # Keep what failed for the next flush
+        self.statuses = {number: status for i, (number, status) in enumerate(statuses)
+                         if i in failed}
+        self.data_entries = [entry for i, entry in enumerate(self.data_entries, len(statuses))
+                             if i in failed]
+        self._start_timer()
+        return len(operations) - len(failed)
+
+
+# The writer of this process, see get_writer
+_writer = dict()
+
+
+def get_writer():
+    """The RunDBWriter of this process, which is flushed at exit"""
+    if 'writer' not in _writer:
+        _writer['writer'] = RunDBWriter()
+        atexit.register(_writer['writer'].flush)
+    return _writer['writer']
+
+
+def flush_writes():
+    """Send the queued rundb updates of this process"""
+    if 'writer' in _writer:
+        return _writer['writer'].flush()
+    return 0
+
+
+def update_processing_status(run_id, status, reason=None, host='stbc', production=False, pull=None, is_online=False):
     """
-    Update the processing status of a run in the MongoDB rundb.
+    Update the processing status of a run in the MongoDB rundb. The update
+    is queued, see RunDBWriter and flush_writes.
 
     :param run_id: ID of the run to update.
     :param status: New status (e.g., 'running', 'done', 'failed').
@@ -20,9 +163,6 @@ def update_processing_status(run_id, status, reason=None, host='stbc', productio
     :param production: If True, actually updates the database, else simulates the update.
     :return: None
     """
-    
-    runsdb = amstrax.get_mongo_collection()
-
 
     update = {
         'status': status,
@@ -39,14 +179,7 @@ def update_processing_status(run_id, status, reason=None, host='stbc', productio
         
 
     if production and is_online:
-        runsdb.update_one(
-            {'number': int(run_id)},
-            {
-                '$set': {'processing_status': update},
-                '$inc': increase,
-                '$pull': pull
-            }
-        )
+        get_writer().queue_status(run_id, update, increase=increase, pull=pull)
         log.info(f"Run {run_id} updated to status {status} in production mode.")
     else:
         log.info(f"Would update run {run_id} to status {status} (dry run).")
@@ -67,7 +200,9 @@ def add_data_entry(
         **kwargs
     ):
     """
-    Add a new data entry (e.g., raw records) for a run in the rundb.
+    Add a new data entry (e.g., raw records) for a run in the rundb, unless
+    it has an entry of the same type, location and lineage already. The
+    update is queued, see RunDBWriter and flush_writes.
 
     :param run_id: ID of the run to update.
     :param data_type: Type of data (e.g., 'raw_records').
@@ -79,9 +214,6 @@ def add_data_entry(
     :return: None
     """
 
-    runsdb = amstrax.get_mongo_collection()
-
-
     data_entry = {
         'time': datetime.datetime.now(),
         'type': data_type,
@@ -104,33 +236,35 @@ def add_data_entry(
         log.info(f"{key}: {value}")
         
     if production:
-        run_doc = runsdb.find_one({'number': int(run_id)})
-        for entry in run_doc.get('data', []):
-            if entry.get('type', None) == data_type and \
-                entry.get('location', None) == location and \
-                    entry.get('lineage_hash', None) == lineage_hash:
-
-                log.info(f"Entry for run {run_id} of type {data_type} and location {location} already exists.")
-                return
-        runsdb.update_one(
-            {'number': int(run_id)},
-            {'$push': {'data': data_entry}}
-        )
-        log.info(f"Data entry for run {run_id} added successfully in production mode.")
+        get_writer().queue_data_entry(run_id, data_entry)
+        log.info(f"Data entry for run {run_id} queued in production mode.")
     else:
         log.info(f"Would add data entry to run {run_id} (dry run).")
 
 
-def get_run_doc(run_id):
+def get_run_doc(run_id, run_catalog=None):
     """
     Get the document for a specific run from the rundb.
     
     :param run_id: ID of the run to retrieve.
+    :param run_catalog: path of a RunCatalog to read the document from,
+        instead of the rundb. Runs that are not in it are read from the rundb.
     :return: Document for the run.
     """
-    
-    runsdb = amstrax.get_mongo_collection()
+
+    if run_catalog is not None:
+        run_doc = amstrax.RunCatalog(run_catalog, readonly=True).run_doc(run_id)
+        if run_doc is not None:
+            log.info(f"Found run {run_id} in the run catalog {run_catalog}.")
+            return run_doc
+        # E.g. the catalog was synced before the run ended
+        log.warning(f"Run {run_id} is not in the run catalog {run_catalog}, "
+                    f"getting it from the database.")
+
+    runsdb = get_runsdb()
 
     run_doc = runsdb.find_one({'number': int(run_id)})
+    if run_doc is None:
+        raise ValueError(f"Run {run_id} is not in the database.")
     log.info(f"Found run {run_id} in the database.")
     return run_doc
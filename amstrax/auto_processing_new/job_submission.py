@@ -1,4 +1,5 @@
 # job_submission.py
+import json
 import os
 import subprocess
 import shlex
@@ -10,6 +11,7 @@ log = logging.getLogger(__name__)
 
 condor_template = """
 executable            = {job_executable}
+batch_name            = {jobname}
 log                   = {log}
 output                = {output}
 error                 = {error}
@@ -70,6 +72,7 @@ def submit_job(
     # Create the condor submission script
     condor_script = condor_template.format(
         job_executable=job_executable,
+        jobname=jobname,
         log=log_file,
         output=output_file,
         error=output_file,
@@ -100,6 +103,69 @@ def submit_job(
             os.remove(condor_file)
 
 
+def condor_q_json():
+    """The job ads of the jobs in the condor queue, from `condor_q -json`"""
+    result = subprocess.run(
+        ["condor_q", "-json", "-attributes", "ClusterId,ProcId,JobStatus,JobBatchName,Cmd"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"condor_q command failed: {result.stderr}")
+    # condor_q prints nothing at all for an empty queue
+    return json.loads(result.stdout) if result.stdout.strip() else []
+
+
+class CondorJobState:
+    """
+    Snapshot of the condor queue, with the jobs by their exact job name (as
+    given to submit_job). Take one per scheduling cycle, instead of calling
+    condor_q for every run.
+
+    :param query: function that returns the job ads in the queue, by default
+        condor_q_json
+    :param fail_safe: what is_active returns if the queue could not be read
+    """
+
+    # HTCondor JobStatus codes of jobs that are no longer active
+    REMOVED, COMPLETED = 3, 4
+
+    def __init__(self, query=condor_q_json, fail_safe=True):
+        self.query = query
+        self.fail_safe = fail_safe
+        self.jobs = None
+        self.refresh()
+
+    def refresh(self):
+        """Read the condor queue again"""
+        try:
+            ads = self.query()
+        except Exception as e:
+            log.error(f"Could not read the condor queue: {e}")
+            self.jobs = None
+            return
+        self.jobs = dict()
+        for ad in ads:
+            self.jobs.setdefault(self.job_name(ad), []).append(ad)
+
+    @staticmethod
+    def job_name(ad):
+        """The name of the job of ad, from its batch name or (for older jobs) its executable"""
+        if ad.get("JobBatchName"):
+            return ad["JobBatchName"]
+        return os.path.splitext(os.path.basename(ad.get("Cmd", "")))[0]
+
+    @property
+    def ok(self):
+        """Whether the condor queue could be read"""
+        return self.jobs is not None
+
+    def is_active(self, job_name):
+        """Whether a job job_name is idle, running or held"""
+        if self.jobs is None:
+            return self.fail_safe
+        return any(ad.get("JobStatus") not in (self.REMOVED, self.COMPLETED)
+                   for ad in self.jobs.get(job_name, []))
+
+
 def monitor_jobs():
     """
     Placeholder for monitoring jobs. Could be used to check job statuses and handle retries/failures.
@@ -2,7 +2,7 @@ import argparse
 import logging
 import os, sys, json
 from datetime import datetime
-from job_submission import submit_job
+from job_submission import submit_job, CondorJobState
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
@@ -39,6 +39,14 @@ def parse_args():
     parser.add_argument(
         "--corrections_version", default=None, help="Version of corrections to use. Can be ONLINE, v0, v1.."
     )
+    parser.add_argument(
+        "--no_corrections_table", action="store_true",
+        help="Let every job resolve the corrections itself, instead of resolving them for all runs up front."
+    )
+    parser.add_argument(
+        "--run_catalog", default=None,
+        help="Run catalog (see amstrax.RunCatalog) to sync, from which the jobs then read the run metadata."
+    )
     parser.add_argument("--production", action="store_true", help="Run in production mode (update the rundb).")
     parser.add_argument(
         "--dry_run", action="store_true", help="Simulate job submission without actually submitting jobs."
@@ -100,23 +108,16 @@ def check_for_production(args):
             raise ValueError("Output folder not specified.")
 
 
-def check_existing_jobs(job_name):
+def check_existing_jobs(job_name, job_state):
     """
     Check if a job with the same name is already running, idle, or held.
-    """
-    try:
-        result = subprocess.run(['condor_q', '-nobatch'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        if result.returncode != 0:
-            raise RuntimeError(f"condor_q command failed: {result.stderr}")
 
-        for line in result.stdout.splitlines():
-            if job_name in line and " C " not in line:  # Ignore completed jobs
-                log.error(f"Job with name '{job_name}' is already running, idle, or held.")
-                raise ValueError(f"Job with name '{job_name}' is already running, idle, or held.")
-    
-    except Exception as e:
-        log.error(f"Error while checking existing jobs: {e}")
-        sys.exit(1)
+    :param job_state: CondorJobState, a snapshot of the condor queue
+    """
+    if job_state.is_active(job_name):
+        log.error(f"Job with name '{job_name}' is already running, idle, or held.")
+        return True
+    return False
 
 
 def get_run_ids_from_args(args):
@@ -140,6 +141,49 @@ def get_run_ids_from_args(args):
     return run_ids
 
 
+def import_amstrax(args):
+    if args.amstrax_path and args.amstrax_path not in sys.path:
+        sys.path.insert(0, args.amstrax_path)
+    import amstrax
+    return amstrax
+
+
+def sync_run_catalog(args):
+    """
+    Bring the run catalog at args.run_catalog up to date with the rundb, so
+    that the jobs do not need to connect to the rundb to read their runs.
+    """
+    amstrax = import_amstrax(args)
+    catalog = amstrax.RunCatalog(args.run_catalog)
+    n_docs = catalog.sync(amstrax.get_mongo_collection())
+    catalog.close()
+    log.info(f"Synced {n_docs} run documents to the run catalog {args.run_catalog}")
+    return os.path.abspath(args.run_catalog)
+
+
+def write_corrections_table(args, run_ids):
+    """
+    Resolve the corrections of args.corrections_version for all runs at once,
+    and write them to a file in the logs folder for the jobs to use. The file
+    also records the correction values used in this campaign.
+    """
+    amstrax = import_amstrax(args)
+
+    if "@" in args.corrections_version:
+        version, github_branch = args.corrections_version.split("@")
+    else:
+        version, github_branch = args.corrections_version, "master"
+
+    table = amstrax.CorrectionsTable.resolve(run_ids, version, branch=github_branch)
+    os.makedirs(args.logs_path, exist_ok=True)
+    path = os.path.join(
+        os.path.abspath(args.logs_path),
+        f"corrections_{version}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    table.to_file(path)
+    log.info(f"Resolved corrections {args.corrections_version} for {len(run_ids)} runs in {path}")
+    return path
+
+
 def main(args):
     """
     Main function for offline job submission of selected runs.
@@ -148,6 +192,19 @@ def main(args):
     # Get the run IDs from the arguments
     run_ids = get_run_ids_from_args(args)
 
+    corrections_table = None
+    if args.corrections_version and not args.no_corrections_table:
+        corrections_table = write_corrections_table(args, run_ids)
+
+    run_catalog = None
+    if args.run_catalog:
+        run_catalog = sync_run_catalog(args)
+
+    # One look at the condor queue for all runs
+    job_state = CondorJobState(fail_safe=False)
+    if not job_state.ok:
+        log.warning("Could not check for jobs already in the condor queue.")
+
     # Submit jobs for each run
     for run_id in run_ids:
 
@@ -160,6 +217,10 @@ def main(args):
             # we want to extract the last part of the path, for example vTEST1
             jobname += f"_{args.amstrax_path.rstrip('/').split('/')[-1]}_production"
 
+        if check_existing_jobs(jobname, job_state):
+            log.error(f"Not submitting run {run_id} again.")
+            continue
+
         arguments = []
         arguments.append(f"--run_id {run_id}")
         arguments.append(f"--targets {' '.join(args.targets)}")
@@ -168,6 +229,10 @@ def main(args):
             arguments.append(f"--output_folder {args.output_folder}")
         if args.corrections_version:
             arguments.append(f"--corrections_version {args.corrections_version}")
+        if corrections_table:
+            arguments.append(f"--corrections_table {corrections_table}")
+        if run_catalog:
+            arguments.append(f"--run_catalog {run_catalog}")
         if args.amstrax_path:
             arguments.append(f"--amstrax_path {args.amstrax_path}")
         if args.production:
@@ -19,6 +19,8 @@ class RunProcessor:
         self.output_folder = args.output_folder
         self.allow_raw_records = args.allow_raw_records
         self.corrections_version = args.corrections_version
+        self.corrections_table = args.corrections_table
+        self.run_catalog = args.run_catalog
         self.production = args.production
         self.amstrax_path = args.amstrax_path
         self.is_online = args.is_online
@@ -32,6 +34,8 @@ class RunProcessor:
         log.info(f" --Output folder: {self.output_folder}")
         log.info(f" --Allow raw_records: {self.allow_raw_records}")
         log.info(f" --Corrections version: {self.corrections_version}")
+        log.info(f" --Corrections table: {self.corrections_table}")
+        log.info(f" --Run catalog: {self.run_catalog}")
         log.info(f" --Production: {self.production}")
         log.info(f" --Amstrax path: {self.amstrax_path}")
         log.info(f" --This file: {__file__}")
@@ -39,7 +43,7 @@ class RunProcessor:
 
         self.setup_amstrax()
         self.setup_production()
-        self.run_doc = self.db_utils.get_run_doc(self.run_id)
+        self.run_doc = self.db_utils.get_run_doc(self.run_id, run_catalog=self.run_catalog)
         self.get_run_doc_info()
 
     def setup_amstrax(self):
@@ -55,6 +59,10 @@ class RunProcessor:
 
         self.db_utils = self.amstrax.db_utils
 
+        if self.corrections_table:
+            # Corrections resolved for the whole campaign, no need to fetch them
+            amstrax.use_corrections_table(self.corrections_table)
+
     def get_run_doc_info(self):
         """ This one is just to extract the run document details and log them. """
 
@@ -260,7 +268,8 @@ class RunProcessor:
 
         st = self.amstrax.contexts.xams(
             output_folder=self.output_folder,
-            corrections_version=self.corrections_version
+            corrections_version=self.corrections_version,
+            run_catalog=self.run_catalog,
         )
         st.storage += [strax.DataDirectory(raw_records_folder, readonly=True)]
 
@@ -298,6 +307,10 @@ def parse_args():
     parser.add_argument("--output_folder", type=str, help="Path to save the processed data.", default=None)
     parser.add_argument("--allow_raw_records", action="store_true", help="Explicitly allow raw_records processing.")
     parser.add_argument("--corrections_version", type=str, default=None, help="Version of corrections to apply.")
+    parser.add_argument("--corrections_table", type=str, default=None,
+                        help="File with the corrections resolved for all runs, see amstrax.CorrectionsTable.")
+    parser.add_argument("--run_catalog", type=str, default=None,
+                        help="Run catalog to read the run metadata from instead of the rundb, see amstrax.RunCatalog.")
     parser.add_argument("--amstrax_path", type=str, default=None, help="Version of amstrax to use.")
     parser.add_argument("--production", action="store_true", help="Update the production database.")
     parser.add_argument("--is_online", action="store_true", help="Process online data.")
@@ -310,6 +323,8 @@ def main():
     args = parse_args()
     processor = RunProcessor(args)
     processor.process()
+    # Send the status and data entries of this run
+    processor.db_utils.flush_writes()
 
 
 if __name__ == "__main__":
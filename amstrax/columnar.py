@@ -0,0 +1,204 @@
+import json
+import operator
+import os
+import re
+
+import numpy as np
+import strax
+
+export, __all__ = strax.exporter()
+
+# Operators of the predicates that the loader can push down
+PREDICATE_OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+}
+_predicate_pattern = re.compile(r'^\s*(\w+)\s*(<=|>=|==|<|>)\s*(\S+)\s*$')
+
+STATS_FILE = 'stats.json'
+
+
+@export
+def export_columnar(st, run_id, data_type, export_dir, overwrite=False):
+    """
+    Write data_type (e.g. event_info or peak_basics) of run_id to a columnar
+    store in export_dir: one .npy file per column, in
+    export_dir/data_type/run_id/, and a stats.json with the number of rows and
+    the min and max of each column.
+
+    :return: the directory with the files of the run
+    """
+    run_dir = _run_dir(export_dir, data_type, run_id)
+    if os.path.exists(os.path.join(run_dir, STATS_FILE)) and not overwrite:
+        return run_dir
+    data = st.get_array(run_id, data_type, progress_bar=False)
+    write_columnar(data, run_dir)
+    return run_dir
+
+
+@export
+def write_columnar(data, run_dir):
+    """Write the structured array data to run_dir, see export_columnar"""
+    os.makedirs(run_dir, exist_ok=True)
+    stats = dict(n_rows=len(data), columns=dict())
+    for column in data.dtype.names:
+        values = np.ascontiguousarray(data[column])
+        stats['columns'][column] = dict(dtype=values.dtype.str,
+                                        shape=values.shape[1:],
+                                        **_min_max(values))
+        _atomic_save(os.path.join(run_dir, f'{column}.npy'), values)
+
+    # The stats are written last, they mark the run as exported
+    tmp_path = os.path.join(run_dir, f'{STATS_FILE}.{os.getpid()}.tmp')
+    with open(tmp_path, mode='w') as f:
+        json.dump(stats, f)
+    os.replace(tmp_path, os.path.join(run_dir, STATS_FILE))
+
+
+@export
+def exported_runs(export_dir, data_type):
+    """The run_ids of the runs of data_type in export_dir"""
+    type_dir = os.path.join(export_dir, data_type)
+    if not os.path.exists(type_dir):
+        return []
+    return sorted(run_id for run_id in os.listdir(type_dir)
+                  if os.path.exists(os.path.join(type_dir, run_id, STATS_FILE)))
+
+
+@export
+def load_columnar(export_dir, data_type, run_ids=None, columns=None, where=None,
+                  add_run_id_field=True):
+    """
+    Load data_type from the columnar store in export_dir.
+
+    Only the files of the requested columns and of those in the predicates
+    are read, and they are memory-mapped, so for a selection only the
+    selected rows of the columns are read. Runs of which the min and max
+    show that no row can pass the predicates are not opened at all.
+
+    :param run_ids: run_ids to load, by default all exported runs
+    :param columns: columns to load, by default all
+    :param where: predicates that all rows must pass, as strings like
+        'cs1 < 500' or tuples like ('cs1', '<', 500)
+    :param add_run_id_field: add a run_id field to the result
+    :return: structured array
+    """
+    if run_ids is None:
+        run_ids = exported_runs(export_dir, data_type)
+    run_ids = strax.to_str_tuple(run_ids)
+    predicates = [parse_predicate(p) for p in _as_predicate_list(where)]
+
+    results = []
+    dtype = None
+    for run_id in run_ids:
+        run_dir = _run_dir(export_dir, data_type, run_id)
+        with open(os.path.join(run_dir, STATS_FILE), mode='r') as f:
+            stats = json.load(f)
+
+        if dtype is None:
+            dtype = _result_dtype(stats, columns, add_run_id_field)
+        if not all(_may_pass(stats['columns'][column], op, value)
+                   for column, op, value in predicates):
+            continue
+
+        selection = np.ones(stats['n_rows'], dtype=np.bool_)
+        for column, op, value in predicates:
+            selection &= PREDICATE_OPERATORS[op](_open_column(run_dir, column), value)
+        index = np.flatnonzero(selection)
+
+        result = np.zeros(len(index), dtype=dtype)
+        for column in result.dtype.names:
+            if column == 'run_id' and add_run_id_field:
+                result[column] = run_id
+            else:
+                result[column] = _open_column(run_dir, column)[index]
+        results.append(result)
+
+    if dtype is None:
+        raise ValueError(f'No exported {data_type} for {run_ids} in {export_dir}')
+    if not results:
+        return np.zeros(0, dtype=dtype)
+    return np.concatenate(results)
+
+
+@export
+def parse_predicate(predicate):
+    """Return (column, operator, value) for 'column operator value' or such a tuple"""
+    if isinstance(predicate, str):
+        match = _predicate_pattern.match(predicate)
+        if match is None:
+            raise ValueError(f"Cannot parse predicate '{predicate}', use e.g. 'cs1 < 500'")
+        column, op, value = match.groups()
+        value = float(value) if value.lower() not in ('true', 'false') else value.lower() == 'true'
+    else:
+        column, op, value = predicate
+    if op not in PREDICATE_OPERATORS:
+        raise ValueError(f'Unknown operator {op}, use one of {list(PREDICATE_OPERATORS)}')
+    return column, op, value
+
+
+def _as_predicate_list(where):
+    if where is None:
+        return []
+    if isinstance(where, str) or (
+            isinstance(where, tuple) and len(where) == 3 and where[1] in PREDICATE_OPERATORS):
+        return [where]
+    return list(where)
+
+
+def _run_dir(export_dir, data_type, run_id):
+    return os.path.join(export_dir, data_type, run_id)
+
+
+def _open_column(run_dir, column):
+    return np.load(os.path.join(run_dir, f'{column}.npy'), mmap_mode='r')
+
+
+def _atomic_save(path, values):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, mode='wb') as f:
+        np.save(f, values)
+    os.replace(tmp_path, path)
+
+
+def _min_max(values):
+    """Min and max of a scalar column (None if it has no non-NaN values)"""
+    if values.ndim != 1 or values.dtype.kind not in 'biuf':
+        return dict(min=None, max=None)
+    finite = values[~np.isnan(values)] if values.dtype.kind == 'f' else values
+    if not len(finite):
+        return dict(min=None, max=None)
+    return dict(min=finite.min().item(), max=finite.max().item())
+
+
+def _may_pass(column_stats, op, value):
+    """Whether any row of a run with column_stats can pass the predicate"""
+    if column_stats['shape']:
+        raise ValueError('Predicates are only supported on scalar columns')
+    low, high = column_stats['min'], column_stats['max']
+    if low is None:
+        # Only NaNs (which never pass) or no rows at all
+        return False
+    return {'<': low < value,
+            '<=': low <= value,
+            '>': high > value,
+            '>=': high >= value,
+            '==': low <= value <= high}[op]
+
+
+def _result_dtype(stats, columns, add_run_id_field):
+    if columns is None:
+        columns = list(stats['columns'])
+    columns = strax.to_str_tuple(columns)
+    missing = [column for column in columns if column not in stats['columns']]
+    if missing:
+        raise ValueError(f'Columns {missing} are not exported')
+    dtype = [(column, np.dtype(stats['columns'][column]['dtype']),
+              tuple(stats['columns'][column]['shape']))
+             for column in columns]
+    if add_run_id_field:
+        dtype.append(('run_id', '<U32'))
+    return np.dtype(dtype)
@@ -1,4 +1,5 @@
 import os
+import warnings
 from datetime import timezone
 
 import strax
@@ -32,6 +33,7 @@ COMMON_OPT_XAMS = dict(
         ax.PeakPositions,
         # Events
         ax.Events,
+        ax.PeakEventIndex,
         ax.EventBasics,
         ax.EventPositions,
         ax.EventCoincidences,
@@ -39,6 +41,8 @@ COMMON_OPT_XAMS = dict(
         ax.EventInfo,
         ax.EventWaveform,
         ax.EventAreaPerChannel,
+        *ax.CUT_REGISTRY.values(),
+        ax.CutsBasic,
         # External PMT plugins
         ax.PulseProcessingEXT,
         ax.PeaksEXT,
@@ -47,6 +51,7 @@ COMMON_OPT_XAMS = dict(
         ax.PulseProcessingSiPM,
         ax.PeaksSiPM,
         ax.PeakBasicsSiPM,
+        ax.PeakSiPMMatch,
         # Coincidences
         ax.PeakCoincidences,
         # LED plugins not default
@@ -77,9 +82,15 @@ def xams(
         mongo_collname=CONFIG["DEFAULT_COLLECTION"], mongo_dbname=CONFIG["DEFAULT_RUNCOLNAME"], runid_field="number"
     ),
     corrections_version=None,
+    run_catalog=None,
     *args,
     **kwargs,
 ):
+    """
+    The XAMS context. With run_catalog (the path of a RunCatalog) the run
+    metadata and data locations are read from that catalog instead of the
+    rundb, so no connection to the rundb is needed.
+    """
 
     st = strax.Context(
         **COMMON_OPT_XAMS, 
@@ -91,7 +102,9 @@ def xams(
     st.set_config(XAMS_COMMON_CONFIG)
 
     st.storage = []
-    if init_rundb:
+    if run_catalog is not None:
+        st.storage = [ax.RunCatalogFrontend(run_catalog)]
+    elif init_rundb:
         if mongo_kwargs is None:
             raise RuntimeError("You need to provide mongo-kwargs!")
         st.storage = [
@@ -118,6 +131,49 @@ def xams(
     return st
 
 
+def superrun_name(first_run, last_run):
+    """Name of the superrun of the consecutive runs first_run to last_run"""
+    return f"_{int(first_run):06d}_{int(last_run):06d}"
+
+
+def subrun_ids(run_id):
+    """
+    The run_ids of the runs in a superrun named by superrun_name (with or
+    without the leading underscore), or just (run_id,) for a normal run.
+    """
+    parts = run_id.lstrip("_").split("_")
+    if len(parts) != 2:
+        return (run_id,)
+    first_run, last_run = (int(part) for part in parts)
+    return tuple(f"{run:06d}" for run in range(first_run, last_run + 1))
+
+
+def define_superrun(st: strax.Context, run_ids, write=True) -> str:
+    """
+    Define a superrun of consecutive runs, such that they can be processed in
+    one go as a single stream of data (from peaks up). Events are not built
+    across the runs.
+
+    :param st: context, with a storage frontend that can define runs
+    :param run_ids: the run_ids to combine, which must be consecutive
+    :param write: save the data of the superrun (instead of only of the runs)
+    :return: the name of the superrun, e.g. _001200_001250
+    """
+    run_numbers = sorted(int(run_id) for run_id in strax.to_str_tuple(run_ids))
+    if not run_numbers:
+        raise ValueError("Need at least one run to define a superrun")
+    missing = sorted(set(range(run_numbers[0], run_numbers[-1] + 1)) - set(run_numbers))
+    if missing or len(set(run_numbers)) != len(run_numbers):
+        raise ValueError(f"Superruns must consist of consecutive runs, "
+                         f"missing {missing} in {run_numbers}")
+
+    name = superrun_name(run_numbers[0], run_numbers[-1])
+    st.define_run(name, [f"{run:06d}" for run in run_numbers])
+    if write:
+        st.set_context_config(dict(write_superruns=True))
+    return name
+
+
 def context_for_daq_reader(
     st: strax.Context,
     run_id: str,
@@ -241,8 +297,9 @@ def apply_global_correction_version(context: strax.Context, global_version: str)
     else:
         github_branch = "master"
 
-    global_corrections_file = f"_global_{global_version}.json"
-    global_corrections = ax.get_correction(global_corrections_file, branch=github_branch)
+    # Get the global file and all the correction files it refers to in one go,
+    # unless the corrections table in use has them
+    global_corrections = ax.global_corrections(global_version, branch=github_branch)
 
     # Iterate over all the relevant corrections specified in the global file
     xams_config = {}
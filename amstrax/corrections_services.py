@@ -1,38 +1,242 @@
+import hashlib
+import json
 import os
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 import strax
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 export, __all__ = strax.exporter()
+__all__ += ["CORRECTIONS_CACHE_DIR_ENV", "CORRECTIONS_OFFLINE_ENV", "CORRECTIONS_URL_ENV"]
 
 GITHUB_RAW_URL = "https://raw.githubusercontent.com/XAMS-nikhef/amstrax_files/{branch}/corrections/"
 
+# Where to get the corrections from instead of GitHub: an http(s) URL or a
+# local directory, like GITHUB_RAW_URL (with or without {branch})
+CORRECTIONS_URL_ENV = "AMSTRAX_CORRECTIONS_URL"
+
+# Directory of the on-disk correction cache, can be shared between jobs
+CORRECTIONS_CACHE_DIR_ENV = "AMSTRAX_CORRECTIONS_CACHE_DIR"
+# Set to 1 to only use the on-disk cache, without going to GitHub
+CORRECTIONS_OFFLINE_ENV = "AMSTRAX_CORRECTIONS_OFFLINE"
+
+# Corrections fetched in this process, by (branch, file_name)
+_fetched = dict()
+# Clients by base_url, see correction_client
+_clients = dict()
+
+
+@export
+class CorrectionClient:
+    """
+    Fetches correction files from base_url, which is GitHub by default.
+
+    base_url is a URL or a local directory (a mirror of the corrections
+    directory of amstrax_files), in which {branch} is replaced by the branch.
+    HTTP requests share a pooled session, with retries and a timeout.
+    """
+
+    def __init__(self, base_url=GITHUB_RAW_URL, timeout=10, retries=3, max_workers=8):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.max_workers = max_workers
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def is_local(self):
+        return not self.base_url.startswith(("http://", "https://"))
+
+    @property
+    def session(self):
+        with self._session_lock:
+            if self._session is None:
+                retry = Retry(total=self.retries, backoff_factor=0.5,
+                              status_forcelist=(429, 500, 502, 503, 504),
+                              allowed_methods=("GET",))
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers,
+                                      max_retries=retry)
+                self._session = requests.Session()
+                self._session.mount("http://", adapter)
+                self._session.mount("https://", adapter)
+            return self._session
+
+    def url(self, file_name, branch="master"):
+        base_url = self.base_url.format(branch=branch)
+        if self.is_local:
+            return os.path.join(base_url, file_name)
+        return base_url.rstrip("/") + "/" + file_name
+
+    def fetch(self, file_name, branch="master", etag=None):
+        """
+        Fetch a correction file (including its directory, e.g. elife/elife_v0.json).
+        Returns (content, etag), where content is None if the file did not
+        change since etag.
+        """
+        url = self.url(file_name, branch)
+        if self.is_local:
+            if not os.path.exists(url):
+                raise FileNotFoundError(f"File {file_name} not found in {self.base_url}")
+            with open(url, mode="rb") as f:
+                return f.read(), None
+
+        print(f"Fetching {file_name} from {url}")
+        headers = {"If-None-Match": etag} if etag else {}
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+
+        if response.status_code == 304:
+            return None, etag
+        if response.status_code == 200:
+            # check that it is json before it goes into the cache
+            json.loads(response.content)
+            return response.content, response.headers.get("ETag")
+        else:
+            raise FileNotFoundError(f"File {file_name} not found in {self.base_url}")
+
+    def prefetch(self, file_names, branch="master"):
+        """Get the correction files in parallel, after which get_correction has them"""
+        file_names = [f for f in set(file_names) if (branch, _file_path(f)) not in _fetched]
+        if not file_names:
+            return
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # list() to raise any errors
+            list(executor.map(lambda f: get_correction(f, branch=branch, client=self), file_names))
+
+    def prefetch_global_version(self, version, branch="master"):
+        """Get the global corrections file of version and all correction files it refers to"""
+        global_corrections = get_correction(f"_global_{version}.json", branch=branch, client=self)
+        self.prefetch([value for value in global_corrections.values()
+                       if isinstance(value, str) and value.endswith(".json")],
+                      branch=branch)
+        return global_corrections
+
+
+@export
+def correction_client():
+    """The client for the corrections, from AMSTRAX_CORRECTIONS_URL or GitHub"""
+    base_url = os.environ.get(CORRECTIONS_URL_ENV, GITHUB_RAW_URL)
+    if base_url not in _clients:
+        _clients[base_url] = CorrectionClient(base_url)
+    return _clients[base_url]
+
 
 @export
-def get_correction(file_name, branch="master"):
+def get_correction(file_name, branch="master", client=None):
     """
-    Get correction file from GitHub or locally.
-    It first tries to download from GitHub, and if that fails, it fetches from the local corrections directory.
+    Get correction file from GitHub (or where the client gets it from).
+
+    Files are fetched once per process. They are kept in an on-disk cache
+    (see corrections_cache_dir), and revalidated with GitHub through their
+    ETag, so unchanged files are not downloaded again. In offline mode
+    (AMSTRAX_CORRECTIONS_OFFLINE=1) only the cache is used.
     """
 
+    file_name = _file_path(file_name)
+    key = (branch, file_name)
+    if key not in _fetched:
+        _fetched[key] = _fetch_cached(file_name, branch, client or correction_client())
+    return _fetched[key]
+
+
+def _file_path(file_name):
     # extract the part of the file that comes upto the last _ (e.g. 'gain_to_pe' from 'gain_to_pe_v1')
     dir_path = '_'.join(file_name.split('_')[:-1])
     # because we put correction files in the corrections directory ( gain_to_pe/gain_to_pe_v1.json )
     # we need to append the directory path to the file name
-    file_name = os.path.join(dir_path, file_name)
+    return os.path.join(dir_path, file_name)
+
+
+@export
+def corrections_cache_dir():
+    """Directory of the on-disk correction cache, set AMSTRAX_CORRECTIONS_CACHE_DIR to change it"""
+    return os.environ.get(CORRECTIONS_CACHE_DIR_ENV,
+                          os.path.join(os.path.expanduser("~"), ".cache", "amstrax", "corrections"))
+
+
+@export
+def corrections_offline():
+    """Whether corrections are only taken from the on-disk cache"""
+    return os.environ.get(CORRECTIONS_OFFLINE_ENV, "0").lower() in ("1", "true", "yes")
+
+
+def _fetch_cached(file_name, branch, client):
+    """
+    Fetch a correction file through the on-disk cache. The cache stores the
+    files by the hash of their content, and refers to them per (branch, file_name)
+    together with the ETag of the file on GitHub.
+    """
+    if client.is_local:
+        # Nothing to gain from caching a local mirror
+        return json.loads(client.fetch(file_name, branch)[0])
+
+    ref = _read_ref(file_name, branch)
+    if corrections_offline():
+        if ref is None:
+            raise FileNotFoundError(f"{file_name} ({branch}) is not in the correction cache "
+                                    f"{corrections_cache_dir()} and we are offline")
+        return _read_object(ref["sha256"])
+
+    try:
+        content, etag = client.fetch(file_name, branch, etag=ref["etag"] if ref else None)
+    except requests.RequestException as e:
+        if ref is None:
+            raise
+        warnings.warn(f"Could not revalidate {file_name} ({branch}), using the cached file: {e}")
+        return _read_object(ref["sha256"])
+
+    if content is None:
+        # Not modified
+        return _read_object(ref["sha256"])
+    sha256 = _write_object(content)
+    _write_ref(file_name, branch, dict(sha256=sha256, etag=etag))
+    return json.loads(content)
+
+
+def _ref_path(file_name, branch):
+    return os.path.join(corrections_cache_dir(), "refs", branch, file_name)
+
+
+def _object_path(sha256):
+    return os.path.join(corrections_cache_dir(), "objects", sha256[:2], f"{sha256}.json")
+
+
+def _read_ref(file_name, branch):
+    path = _ref_path(file_name, branch)
+    if not os.path.exists(path):
+        return None
+    with open(path, mode="r") as f:
+        ref = json.load(f)
+    if not os.path.exists(_object_path(ref["sha256"])):
+        return None
+    return ref
+
+
+def _write_ref(file_name, branch, ref):
+    _atomic_write(_ref_path(file_name, branch), json.dumps(ref).encode())
+
+
+def _read_object(sha256):
+    with open(_object_path(sha256), mode="rb") as f:
+        return json.loads(f.read())
 
-    return _fetch_from_github(file_name, branch)
 
+def _write_object(content):
+    sha256 = hashlib.sha256(content).hexdigest()
+    path = _object_path(sha256)
+    if not os.path.exists(path):
+        _atomic_write(path, content)
+    return sha256
 
-def _fetch_from_github(file_name, branch="master"):
-    """Fetch correction file from GitHub raw URL"""
-    url = GITHUB_RAW_URL.format(branch=branch) + file_name
-    print(f"Fetching {file_name} from GitHub at {url}")
-    response = requests.get(url)
 
-    if response.status_code == 200:
-        # Successfully fetched the file, return its contents
-        print(f"Fetched {file_name} from GitHub")
-        # return it as a json file (as a dictionary)
-        return response.json()
-    else:
-        raise FileNotFoundError(f"File {file_name} not found in GitHub repository")
+def _atomic_write(path, content):
+    # Write to a temporary file first, so other jobs never read half a file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, mode="wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
@@ -0,0 +1,119 @@
+import json
+import os
+import warnings
+
+import strax
+
+import amstrax
+
+export, __all__ = strax.exporter()
+__all__ += ["CORRECTIONS_TABLE_ENV"]
+
+# Path of a corrections table (see CorrectionsTable) for XAMSConfig to use
+CORRECTIONS_TABLE_ENV = "AMSTRAX_CORRECTIONS_TABLE"
+
+# Fill value for the runs a correction file has no value for, see CorrectionsTable.resolve
+_UNRESOLVED = object()
+
+# The table in use, see use_corrections_table
+_active_table = dict(table=None, set=False)
+
+
+@export
+class CorrectionsTable:
+    """
+    The correction values of a global version for a list of runs, resolved in
+    one go for a processing campaign.
+
+    The table is written to a small json file, which jobs read instead of
+    fetching and parsing the correction files (see use_corrections_table).
+    It also records which values were used. The XAMSConfig options stay the
+    same, so the data has the same lineage as without the table.
+    """
+
+    def __init__(self, global_version, branch, global_corrections, values):
+        self.global_version = global_version
+        self.branch = branch
+        self.global_corrections = global_corrections
+        # file name: {run_id: value}
+        self.values = values
+        self._indices = dict()
+
+    @classmethod
+    def resolve(cls, run_ids, global_version, branch="master"):
+        """
+        Resolve the corrections of global_version for all run_ids. Runs for
+        which a correction file has no value are left out of the table for
+        that file, with a warning.
+        """
+        run_ids = [f"{int(run_id):06d}" for run_id in strax.to_str_tuple(run_ids)]
+        global_corrections = amstrax.correction_client().prefetch_global_version(
+            global_version, branch=branch)
+
+        values = dict()
+        for file_name in global_corrections.values():
+            if not (isinstance(file_name, str) and file_name.endswith(".json")):
+                continue
+            index = amstrax.correction_index(file_name, branch=branch)
+            run_values = index.values_for_runs(run_ids, fill_value=_UNRESOLVED).tolist()
+            values[file_name] = {run_id: value for run_id, value in zip(run_ids, run_values)
+                                 if value is not _UNRESOLVED}
+            unresolved = [run_id for run_id, value in zip(run_ids, run_values)
+                          if value is _UNRESOLVED]
+            if unresolved:
+                # The jobs of these runs look the value up themselves (see has)
+                warnings.warn(f"{file_name} has no value for runs {', '.join(unresolved)}, "
+                              f"leaving them out of the corrections table")
+        return cls(global_version, branch, global_corrections, values)
+
+    def has(self, file_name, branch, run_ids):
+        """Whether the table has the values of file_name for all run_ids"""
+        if branch != self.branch or file_name not in self.values:
+            return False
+        return all(f"{int(run_id):06d}" in self.values[file_name] for run_id in run_ids)
+
+    def index(self, file_name):
+        """The CorrectionIntervalIndex of the values of file_name in the table"""
+        if file_name not in self._indices:
+            self._indices[file_name] = amstrax.CorrectionIntervalIndex(self.values[file_name])
+        return self._indices[file_name]
+
+    def global_corrections_for(self, global_version, branch):
+        """The global corrections file of global_version, or None if the table is for another version"""
+        if (global_version, branch) != (self.global_version, self.branch):
+            return None
+        return self.global_corrections
+
+    def to_file(self, path):
+        with open(path, mode="w") as f:
+            json.dump(dict(global_version=self.global_version,
+                           branch=self.branch,
+                           global_corrections=self.global_corrections,
+                           values=self.values),
+                      f, indent=1)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, mode="r") as f:
+            return cls(**json.load(f))
+
+
+@export
+def use_corrections_table(table):
+    """
+    Let XAMSConfig (and apply_global_correction_version) take correction
+    values from table, a CorrectionsTable or the path to one, where it has
+    them. None to stop using a table. By default the table at
+    AMSTRAX_CORRECTIONS_TABLE is used.
+    """
+    if isinstance(table, str):
+        table = CorrectionsTable.from_file(table)
+    _active_table.update(table=table, set=True)
+
+
+@export
+def active_corrections_table():
+    """The CorrectionsTable in use, or None"""
+    if not _active_table["set"] and os.environ.get(CORRECTIONS_TABLE_ENV):
+        use_corrections_table(os.environ[CORRECTIONS_TABLE_ENV])
+    return _active_table["table"]
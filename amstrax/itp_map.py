@@ -0,0 +1,187 @@
+import json
+import os
+
+import numba
+import numpy as np
+import strax
+
+import amstrax
+
+export, __all__ = strax.exporter()
+__all__ += ['MAP_CACHE_DIR_ENV']
+
+# Directory in which maps are cached as .npy files, can be shared between jobs
+MAP_CACHE_DIR_ENV = 'AMSTRAX_MAP_CACHE_DIR'
+
+# Maps that are loaded in this process, by (map name, branch)
+_loaded_maps = dict()
+
+
+@export
+class RegularGridMap:
+    """
+    Multilinear interpolation of a map on a regular grid in one or more
+    dimensions, e.g. a relative light collection efficiency vs. z or (x, y).
+
+    The map is given in the (straxen) regular grid format:
+        {'coordinate_system': [['x', [x_min, x_max, n_x]],
+                               ['y', [y_min, y_max, n_y]]],
+         'map': values with shape (n_x, n_y)}
+    Points outside of the grid get the value at the edge of the grid, NaN
+    coordinates give NaN.
+    """
+
+    def __init__(self, map_data):
+        coordinate_system = map_data['coordinate_system']
+        self.dimensions = tuple(name for name, _ in coordinate_system)
+        limits = np.array([limit for _, limit in coordinate_system], dtype=np.float64).reshape(-1, 3)
+        self.shape = limits[:, 2].astype(np.int64)
+        self.grid_min = limits[:, 0]
+        self.grid_step = np.where(self.shape > 1,
+                                  (limits[:, 1] - limits[:, 0]) / np.maximum(self.shape - 1, 1),
+                                  1.)
+
+        values = np.asarray(map_data['map'], dtype=np.float64)
+        if values.shape != tuple(self.shape):
+            raise ValueError(f"Map has shape {values.shape}, but its coordinate system "
+                             f"{coordinate_system} implies {tuple(self.shape)}")
+        self.values = values.reshape(-1)
+
+    @classmethod
+    def constant(cls, value=1.):
+        """A map without dimensions, that is value everywhere"""
+        return cls({'coordinate_system': [], 'map': value})
+
+    def points(self, data, prefix=''):
+        """
+        Return the coordinates of data (a structured array, or a dict of arrays
+        for maps with dimensions) in the dimensions of the map, as an array of
+        shape (n_points, n_dimensions). The coordinate of dimension dim is
+        data[prefix + dim].
+        """
+        n_points = len(data[f'{prefix}{self.dimensions[0]}']) if self.dimensions else len(data)
+        points = np.zeros((n_points, len(self.dimensions)), dtype=np.float64)
+        for dim_i, dim in enumerate(self.dimensions):
+            points[:, dim_i] = data[f'{prefix}{dim}']
+        return points
+
+    @property
+    def grid(self):
+        """The arguments describing the map for interpolate_regular_grid"""
+        return self.values, self.grid_min, self.grid_step, self.shape
+
+    def __call__(self, *coordinates):
+        """Interpolate the map at the points given by an array per dimension"""
+        if len(coordinates) != len(self.dimensions):
+            raise ValueError(f"Need coordinates for {self.dimensions}, got {len(coordinates)}")
+        points = np.zeros((len(coordinates[0]) if coordinates else 1, len(coordinates)))
+        for dim_i, coordinate in enumerate(coordinates):
+            points[:, dim_i] = coordinate
+        return interpolate_regular_grid(*self.grid, points)
+
+
+@export
+def load_map(map_config, branch='master'):
+    """
+    Return a RegularGridMap for map_config, which is either None (for a map
+    that is 1 everywhere), the map data, a RegularGridMap or the name of a map
+    file in the corrections repository (e.g. fdc_map_v0.json).
+
+    Map files are loaded once per process. They are stored in a local cache
+    (see map_cache_dir) from which the values are memory-mapped, so jobs do
+    not download and parse the map again.
+    """
+    if map_config is None:
+        return RegularGridMap.constant(1.)
+    if isinstance(map_config, RegularGridMap):
+        return map_config
+    if not isinstance(map_config, str):
+        return RegularGridMap(map_config)
+
+    key = (map_config, branch)
+    if key not in _loaded_maps:
+        cache_path = os.path.join(map_cache_dir(), branch, os.path.splitext(map_config)[0])
+        if not os.path.exists(os.path.join(cache_path, 'values.npy')):
+            _cache_map(amstrax.get_correction(map_config, branch=branch), cache_path)
+        _loaded_maps[key] = _load_cached_map(cache_path)
+    return _loaded_maps[key]
+
+
+@export
+def map_cache_dir():
+    """Directory of the local map cache, set AMSTRAX_MAP_CACHE_DIR to change it"""
+    return os.environ.get(MAP_CACHE_DIR_ENV,
+                          os.path.join(os.path.expanduser('~'), '.cache', 'amstrax', 'maps'))
+
+
+def _cache_map(map_data, cache_path):
+    itp_map = RegularGridMap(map_data)
+    os.makedirs(cache_path, exist_ok=True)
+    # Write to temporary files first, so other jobs never load half a map
+    tmp_suffix = f'.{os.getpid()}.tmp'
+    with open(os.path.join(cache_path, 'coordinate_system.json' + tmp_suffix), 'w') as f:
+        json.dump(map_data['coordinate_system'], f)
+    with open(os.path.join(cache_path, 'values.npy' + tmp_suffix), 'wb') as f:
+        np.save(f, itp_map.values.reshape(itp_map.shape))
+    # values last, it marks the map as cached
+    for file_name in ['coordinate_system.json', 'values.npy']:
+        os.replace(os.path.join(cache_path, file_name + tmp_suffix),
+                   os.path.join(cache_path, file_name))
+
+
+def _load_cached_map(cache_path):
+    with open(os.path.join(cache_path, 'coordinate_system.json')) as f:
+        coordinate_system = json.load(f)
+    values = np.load(os.path.join(cache_path, 'values.npy'), mmap_mode='r')
+    return RegularGridMap({'coordinate_system': coordinate_system, 'map': values})
+
+
+@export
+@numba.njit(cache=True, nogil=True)
+def interpolate_regular_grid(values, grid_min, grid_step, shape, points):
+    """
+    Interpolate the map (as given by RegularGridMap.grid) at the points, an
+    array of shape (n_points, n_dimensions)
+    """
+    result = np.zeros(len(points), dtype=np.float64)
+    index = np.zeros(len(shape), dtype=np.int64)
+    weight = np.zeros(len(shape), dtype=np.float64)
+    for point_i in range(len(points)):
+        result[point_i] = interpolate_point(values, grid_min, grid_step, shape,
+                                            points[point_i], index, weight)
+    return result
+
+
+@export
+@numba.njit(cache=True, nogil=True)
+def interpolate_point(values, grid_min, grid_step, shape, point, index, weight):
+    """
+    Interpolate the map at a single point. index and weight are scratch arrays
+    with a length equal to the number of dimensions.
+    """
+    n_dim = len(shape)
+    for dim_i in range(n_dim):
+        if np.isnan(point[dim_i]):
+            return np.nan
+        if shape[dim_i] == 1:
+            index[dim_i] = 0
+            weight[dim_i] = 0.
+            continue
+        # Position in units of grid cells, clipped to the grid
+        x = (point[dim_i] - grid_min[dim_i]) / grid_step[dim_i]
+        x = min(max(x, 0.), shape[dim_i] - 1.)
+        index[dim_i] = min(int(x), shape[dim_i] - 2)
+        weight[dim_i] = x - index[dim_i]
+
+    # Sum over the 2^n_dim corners of the grid cell
+    result = 0.
+    for corner in range(2 ** n_dim):
+        corner_weight = 1.
+        flat_index = 0
+        for dim_i in range(n_dim):
+            upper = (corner >> dim_i) & 1
+            corner_weight *= weight[dim_i] if upper else 1. - weight[dim_i]
+            flat_index = flat_index * shape[dim_i] + index[dim_i] + upper
+        if corner_weight != 0:
+            result += corner_weight * values[flat_index]
+    return result
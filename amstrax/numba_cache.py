@@ -0,0 +1,49 @@
+"""
+Point numba to a shared, version-keyed cache directory so that compiled
+kernels are reused between processes (e.g. condor jobs) instead of being
+compiled again by every job.
+
+This module has to be imported before any module that defines numba
+kernels, since numba decides where to cache a kernel when it is decorated.
+"""
+import os
+import sys
+
+import numba
+
+__all__ = ['NUMBA_CACHE_DIR_ENV', 'numba_cache_dir']
+
+# Set this environment variable (e.g. in setup.sh) to share the cache
+NUMBA_CACHE_DIR_ENV = 'AMSTRAX_NUMBA_CACHE_DIR'
+
+
+def numba_cache_dir(base_dir=None):
+    """
+    Return the directory in which numba kernels are cached for this version
+    of amstrax, numba and python. Returns None if no base_dir is given and
+    the AMSTRAX_NUMBA_CACHE_DIR environment variable is not set.
+    """
+    if base_dir is None:
+        base_dir = os.environ.get(NUMBA_CACHE_DIR_ENV)
+    if not base_dir:
+        return None
+    from . import __version__
+    version_key = (f'amstrax{__version__}_numba{numba.__version__}'
+                   f'_py{sys.version_info.major}{sys.version_info.minor}')
+    return os.path.join(base_dir, version_key)
+
+
+def _set_numba_cache_dir():
+    # An explicit NUMBA_CACHE_DIR always wins
+    if os.environ.get('NUMBA_CACHE_DIR'):
+        return
+    cache_dir = numba_cache_dir()
+    if cache_dir is None:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    # Set both, numba only reloads its config when the environment changes
+    os.environ['NUMBA_CACHE_DIR'] = cache_dir
+    numba.config.CACHE_DIR = cache_dir
+
+
+_set_numba_cache_dir()
@@ -0,0 +1,132 @@
+import sys
+import time
+import warnings
+
+import numba
+import numpy as np
+import strax
+
+import amstrax
+
+export, __all__ = strax.exporter()
+
+
+@export
+def numba_kernels(plugin_classes):
+    """
+    Return a dict of name: numba dispatcher for all numba kernels used by
+    plugin_classes, i.e. the (static)methods of the plugins and the kernels
+    defined in the modules of the plugins.
+    """
+    kernels = dict()
+    for plugin_class in plugin_classes:
+        for klass in plugin_class.__mro__:
+            if not klass.__module__.startswith('amstrax'):
+                continue
+            for name, attr in vars(klass).items():
+                if isinstance(attr, staticmethod):
+                    attr = attr.__func__
+                if isinstance(attr, numba.core.dispatcher.Dispatcher):
+                    kernels[f'{klass.__module__}.{klass.__name__}.{name}'] = attr
+
+        module = sys.modules[plugin_class.__module__]
+        for name, attr in vars(module).items():
+            if isinstance(attr, numba.core.dispatcher.Dispatcher):
+                kernels[f'{module.__name__}.{name}'] = attr
+    return kernels
+
+
+@export
+def is_cacheable(kernel):
+    """Check if the numba kernel writes its compiled code to the disk cache"""
+    return not isinstance(kernel._cache, numba.core.caching.NullCache)
+
+
+def _warmup_calls(st, run_id):
+    """
+    Yield (kernel, args) for all kernels of the registered plugins, with the
+    data types as they are in st. Arrays are empty (or of length one where the
+    kernel needs an element), it's only the types that matter for compiling.
+    """
+    def dtype(data_type):
+        return st._get_plugins((data_type,), run_id)[data_type].dtype_for(data_type)
+
+    def empty(*data_types, length=0):
+        return np.zeros(length, dtype=strax.merged_dtype([dtype(d) for d in data_types]))
+
+    times = np.zeros(0, dtype=np.int64)
+    raw_records = empty('raw_records')
+    records = empty('records')
+    n_tpc_pmts = st.config['n_tpc_pmts']
+
+    yield (amstrax.plugins.raw_records.daqreader.split_channel_ranges,
+           (raw_records, np.zeros((3, 2), dtype=np.int64)))
+
+    pulse_processing = amstrax.plugins.records.pulse_processing
+    yield (pulse_processing._check_overlaps,
+           (raw_records, np.zeros(n_tpc_pmts, dtype=np.int64)))
+    yield (pulse_processing.baseline_per_channel,
+           (records, 20, True, True, 16000))
+    yield (pulse_processing._count_pulses,
+           (records, n_tpc_pmts, np.zeros(1, pulse_processing.pulse_count_dtype(n_tpc_pmts))))
+    yield pulse_processing.mask_and_not, (records, np.zeros(0, dtype=np.bool_))
+    yield pulse_processing.channel_split, (records, n_tpc_pmts)
+
+    for plugin, peaks_type, basics_type in (
+            (amstrax.PeakBasics, 'peaks', 'peak_basics'),
+            (amstrax.PeakBasicsEXT, 'peaks_ext', 'peak_basics_ext'),
+            (amstrax.PeakBasicsSiPM, 'peaks_sipm', 'peak_basics_sipm')):
+        yield plugin.compute_center_times, (empty(peaks_type),)
+        yield plugin.find_n_competing, (empty(basics_type), 0, 0.)
+
+    yield amstrax.PeakCoincidences.matching_peaks, (times, times, 0)
+    yield amstrax.EventCoincidences.matching_peaks, (times, times, 0)
+    yield amstrax.PeakSiPMMatch.match_nearest_in_time, (times, times, 0)
+
+    yield amstrax.group_triggers, (times, times, 0)
+    yield sys.modules[amstrax.PeakEventIndex.__module__]._event_ranges, (times, times)
+
+    peaks = empty(*amstrax.EventBasics.depends_on[1:])
+    yield (amstrax.EventBasics.find_main_alt_s2,
+           (peaks, np.zeros(0, dtype=np.int64), peaks, 0))
+    yield (amstrax.EventBasics.set_event_properties,
+           (empty('event_basics', length=1)[0], peaks, peaks, peaks))
+    yield (amstrax.EventBasics.find_main_alt_peaks,
+           (empty('event_basics'), peaks, times, times, times, False, 0, True, False, 0))
+
+    events = empty('event_basics', 'event_positions')
+    no_map = amstrax.RegularGridMap.constant(1.)
+    points = np.zeros((0, 0))
+    yield (amstrax.CorrectedAreas.correct_areas,
+           (empty('corrected_areas'),
+            events['s1_area'], events['alt_s1_area'], events['s2_area'], events['alt_s2_area'],
+            events['z'], events['drift_time'], np.zeros(3), 1.,
+            *no_map.grid, points, *no_map.grid, points, points))
+
+
+@export
+def warmup(st=None, run_id='000000'):
+    """
+    Compile all numba kernels used by the registered plugins of st, such
+    that they are written to the numba cache. Point AMSTRAX_NUMBA_CACHE_DIR
+    to a shared directory to let all jobs use the same cache.
+
+    :param st: context, by default the xams context without the rundb
+    :param run_id: run_id used to infer the data types of the plugins
+    :return: dict of kernel name: seconds spent compiling
+    """
+    if st is None:
+        st = amstrax.contexts.xams(init_rundb=False)
+
+    kernel_names = {kernel: name
+                    for name, kernel in numba_kernels(st._plugin_class_registry.values()).items()}
+    timing = dict()
+    for kernel, args in _warmup_calls(st, run_id):
+        t0 = time.time()
+        kernel(*args)
+        timing[kernel_names.get(kernel, kernel.__name__)] = time.time() - t0
+
+    not_warm = [name for kernel, name in kernel_names.items() if name not in timing]
+    if not_warm:
+        warnings.warn(f'No warm-up defined for {not_warm}, they will be compiled when used')
+    return timing
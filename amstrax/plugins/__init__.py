@@ -15,6 +15,9 @@ from .peaks import *
 from . import events
 from .events import *
 
+from . import cuts
+from .cuts import *
+
 from . import records_ext
 from .records_ext import *
 
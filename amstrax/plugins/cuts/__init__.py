@@ -0,0 +1,5 @@
+from . import event_cuts
+from .event_cuts import *
+
+from . import basic_cuts
+from .basic_cuts import *
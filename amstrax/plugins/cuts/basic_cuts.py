@@ -0,0 +1,103 @@
+import strax
+
+from .event_cuts import EventCut, register_cut, CUT_REGISTRY
+from ..events.event_positions import DRIFT_TIME_OPTIONS
+
+export, __all__ = strax.exporter()
+
+
+@export
+@register_cut
+@strax.takes_config(
+    strax.Option('cut_s1_area_range', default=(1, 1e5),
+                 help="Range (min, max) of the area of the main S1 in PE"),
+)
+class CutS1Area(EventCut):
+    """Select events with a main S1 area in cut_s1_area_range"""
+    provides = 'cut_s1_area'
+    cut_name = 'cut_s1_area'
+    cut_description = 'Main S1 area in range'
+    __version__ = '0.0.1'
+
+    def cut_by(self, events):
+        low, high = self.config['cut_s1_area_range']
+        return (events['s1_area'] >= low) & (events['s1_area'] < high)
+
+
+@export
+@register_cut
+@strax.takes_config(
+    strax.Option('cut_s2_area_range', default=(10, 1e7),
+                 help="Range (min, max) of the area of the main S2 in PE"),
+)
+class CutS2Area(EventCut):
+    """Select events with a main S2 area in cut_s2_area_range"""
+    provides = 'cut_s2_area'
+    cut_name = 'cut_s2_area'
+    cut_description = 'Main S2 area in range'
+    __version__ = '0.0.1'
+
+    def cut_by(self, events):
+        low, high = self.config['cut_s2_area_range']
+        return (events['s2_area'] >= low) & (events['s2_area'] < high)
+
+
+@export
+@register_cut
+@strax.takes_config(*DRIFT_TIME_OPTIONS)
+class CutDriftTime(EventCut):
+    """Select events with a drift time between the gate and the cathode"""
+    provides = 'cut_drift_time'
+    cut_name = 'cut_drift_time'
+    cut_description = 'Drift time between gate and cathode'
+    __version__ = '0.0.1'
+
+    def cut_by(self, events):
+        return ((events['drift_time'] >= self.config['drift_time_gate'])
+                & (events['drift_time'] <= self.config['drift_time_cathode']))
+
+
+@export
+@register_cut
+@strax.takes_config(
+    strax.Option('cut_s2_aft_range', default=(0., 1.),
+                 help="Range (min, max) of the area fraction top of the main S2"),
+)
+class CutS2AreaFractionTop(EventCut):
+    """Select events with a main S2 area fraction top in cut_s2_aft_range"""
+    provides = 'cut_s2_area_fraction_top'
+    cut_name = 'cut_s2_area_fraction_top'
+    cut_description = 'Main S2 area fraction top in range'
+    __version__ = '0.0.1'
+
+    def cut_by(self, events):
+        low, high = self.config['cut_s2_aft_range']
+        return (events['s2_area_fraction_top'] >= low) & (events['s2_area_fraction_top'] <= high)
+
+
+@export
+@register_cut
+class CutCoincidence(EventCut):
+    """Select events that are coincident with the external detector"""
+    depends_on = ('event_coincidences',)
+    provides = 'cut_coincidence'
+    cut_name = 'cut_coincidence'
+    cut_description = 'Coincident with the external detector'
+    __version__ = '0.0.1'
+
+    def cut_by(self, events):
+        return events['is_coinc']
+
+
+@export
+class CutsBasic(strax.MergeOnlyPlugin):
+    """
+    All basic cuts of the TPC in one data type. Cuts that need other
+    detectors (like cut_coincidence) are not included, load those next to
+    cuts_basic when needed.
+    """
+    depends_on = tuple(name for name in CUT_REGISTRY if name != 'cut_coincidence')
+    provides = 'cuts_basic'
+    save_when = strax.SaveWhen.NEVER
+    allow_superrun = True
+    __version__ = '0.0.1'
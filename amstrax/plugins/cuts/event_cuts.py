@@ -0,0 +1,35 @@
+import strax
+
+export, __all__ = strax.exporter()
+__all__ += ['CUT_REGISTRY']
+
+# All event cuts by the name of the data type they provide, see register_cut
+CUT_REGISTRY = dict()
+
+
+@export
+def register_cut(cut_class):
+    """Add an EventCut to CUT_REGISTRY, to be used as a class decorator"""
+    if not issubclass(cut_class, EventCut):
+        raise TypeError(f"{cut_class} is not an EventCut")
+    CUT_REGISTRY[cut_class.provides] = cut_class
+    return cut_class
+
+
+@export
+class EventCut(strax.CutPlugin):
+    """
+    Base class for cuts on events, which select events with vectorized
+    comparisons of their fields and the config options of the plugin.
+
+    Subclasses set depends_on to the data types with the fields they use
+    and implement cut_by(events), e.g.
+        def cut_by(self, events):
+            low, high = self.config['cut_s1_area_range']
+            return (events['s1_area'] >= low) & (events['s1_area'] < high)
+    The result is a boolean per event (True if the event passes the cut),
+    which is stored such that it is only computed once per run.
+    """
+    depends_on = ('event_basics',)
+    save_when = strax.SaveWhen.ALWAYS
+    allow_superrun = True
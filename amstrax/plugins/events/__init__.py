@@ -1,6 +1,9 @@
 from . import events
 from .events import *
 
+from . import peak_event_index
+from .peak_event_index import *
+
 from . import event_basics
 from .event_basics import *
 
@@ -1,5 +1,6 @@
 from typing import Tuple
 
+import numba
 import numpy as np
 import strax
 import amstrax
@@ -20,11 +21,18 @@ class CorrectedAreas(strax.Plugin):
         cs2_top and cs2_bottom are corrected by the corresponding maps,
         and cs2 is the sum of the two.
 
+    The corrections are resolved once in setup and applied to all events in
+    a single compiled pass. The optional maps are RegularGridMaps of the
+    relative S1 (or S2) light yield, their coordinates are event_positions
+    fields: the main interaction position for the S1 map and the (alt) S2
+    position for the S2 map (e.g. x and y for alt_s2_x and alt_s2_y).
     """
 
-    __version__ = "0.6.0"
+    __version__ = "0.7.0"
 
     depends_on = ("event_basics", "event_positions")
+    parallel = "process"
+    allow_superrun = True
 
     elife = amstrax.XAMSConfig(default=30000, help="electron lifetime in [ns]")
 
@@ -33,6 +41,16 @@ class CorrectedAreas(strax.Plugin):
             [zmin, zmax, y0, a] where y0 + a*z is the correction",
     )
 
+    s1_xyz_map = amstrax.XAMSConfig(default=None,
+        help="Map of the relative S1 light yield vs. the interaction position, "
+             "as map data or the name of a map file, see amstrax.load_map. None for no map",
+    )
+
+    s2_xy_map = amstrax.XAMSConfig(default=None,
+        help="Map of the relative S2 light yield vs. the S2 position, "
+             "as map data or the name of a map file, see amstrax.load_map. None for no map",
+    )
+
 
     def infer_dtype(self):
         dtype = []
@@ -49,18 +67,25 @@ class CorrectedAreas(strax.Plugin):
 
         return dtype
 
+    def setup(self):
+        self.electron_lifetime = float(self.elife)
+
+        zmin, zmax, y0, a = self.s1_naive_z_correction
+        # The correction is the light yield at the center over that at z
+        self.s1_z_parameters = np.array([y0 + a * (zmin + zmax) / 2, y0, a], dtype=np.float64)
+
+        self.s1_map = amstrax.load_map(
+            self.s1_xyz_map, branch=amstrax.correction_branch(self.config['s1_xyz_map']))
+        self.s2_map = amstrax.load_map(
+            self.s2_xy_map, branch=amstrax.correction_branch(self.config['s2_xy_map']))
+
     def get_s1_naive_z_correction(self, z):
         """
         Apply a naive z-dependent S1 correction.
         Returns the correction factor for the S1 area.
         """
-
-        s1_correction_function = lambda z: y0 + a * z
-        zmin, zmax, y0, a = self.s1_naive_z_correction
-        s1_correction_average = s1_correction_function((zmin + zmax) / 2)
-        correction = s1_correction_average/s1_correction_function(z)
-
-        return correction
+        s1_average, y0, a = self.s1_z_parameters
+        return s1_average / (y0 + a * z)
 
     def compute(self, events):
         result = np.zeros(len(events), self.dtype)
@@ -70,11 +95,46 @@ class CorrectedAreas(strax.Plugin):
         # S1 corrections depend on the actual corrected event position.
         # We use this also for the alternate S1; for e.g. Kr this is
         # fine as the S1 correction varies slowly.
-        # event_positions = np.vstack([events["x"], events["y"], events["z"]]).T
-
-        for peak_type in ["", "alt_"]:
-
-            result[f"{peak_type}cs1"] = events[f"{peak_type}s1_area"] * self.get_s1_naive_z_correction(events["z"])
-            result[f"{peak_type}cs2"] = events[f"{peak_type}s2_area"] * np.exp(events["drift_time"] / self.elife)
-
+        self.correct_areas(
+            result,
+            events["s1_area"], events["alt_s1_area"],
+            events["s2_area"], events["alt_s2_area"],
+            events["z"], events["drift_time"],
+            self.s1_z_parameters, self.electron_lifetime,
+            *self.s1_map.grid, self.s1_map.points(events),
+            *self.s2_map.grid, self.s2_map.points(events),
+            self.s2_map.points(events, prefix="alt_s2_"),
+        )
         return result
+
+    @staticmethod
+    @numba.njit(cache=True, nogil=True)
+    def correct_areas(result,
+                      s1_area, alt_s1_area, s2_area, alt_s2_area,
+                      z, drift_time,
+                      s1_z_parameters, electron_lifetime,
+                      s1_map_values, s1_map_min, s1_map_step, s1_map_shape, s1_points,
+                      s2_map_values, s2_map_min, s2_map_step, s2_map_shape, s2_points,
+                      alt_s2_points):
+        """Compute cs1 and cs2 (also for the alternate peaks) for all events"""
+        s1_average, y0, a = s1_z_parameters
+        s1_index = np.zeros(len(s1_map_shape), dtype=np.int64)
+        s1_weight = np.zeros(len(s1_map_shape), dtype=np.float64)
+        s2_index = np.zeros(len(s2_map_shape), dtype=np.int64)
+        s2_weight = np.zeros(len(s2_map_shape), dtype=np.float64)
+
+        for i in range(len(result)):
+            s1_correction = s1_average / (y0 + a * z[i])
+            s1_correction /= amstrax.interpolate_point(
+                s1_map_values, s1_map_min, s1_map_step, s1_map_shape,
+                s1_points[i], s1_index, s1_weight)
+            result[i]["cs1"] = s1_area[i] * s1_correction
+            result[i]["alt_cs1"] = alt_s1_area[i] * s1_correction
+
+            elife_correction = np.exp(drift_time[i] / electron_lifetime)
+            result[i]["cs2"] = s2_area[i] * elife_correction / amstrax.interpolate_point(
+                s2_map_values, s2_map_min, s2_map_step, s2_map_shape,
+                s2_points[i], s2_index, s2_weight)
+            result[i]["alt_cs2"] = alt_s2_area[i] * elife_correction / amstrax.interpolate_point(
+                s2_map_values, s2_map_min, s2_map_step, s2_map_shape,
+                alt_s2_points[i], s2_index, s2_weight)
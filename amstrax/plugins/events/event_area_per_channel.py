@@ -18,10 +18,12 @@ export, __all__ = strax.exporter()
 class EventAreaPerChannel(strax.Plugin):
     """Simple plugin that provides area per channel for main and alternative S1/S2 in the event."""
 
-    depends_on = ("event_basics", "peaks")
+    depends_on = ("event_basics", "peaks", "peak_event_index")
     provides = ("event_area_per_channel", "event_n_channel")
     data_kind = immutabledict(zip(provides, ("events", "events")))
-    __version__ = "0.1.1"
+    parallel = "process"
+    allow_superrun = True
+    __version__ = "0.1.2"
 
     compressor = "zstd"
     save_when = immutabledict({
@@ -78,19 +80,16 @@ class EventAreaPerChannel(strax.Plugin):
         n_channel["time"] = events["time"]
         n_channel["endtime"] = strax.endtime(events)
 
-        split_peaks = strax.split_by_containment(peaks, events)
-        for event_i, (event, sp) in enumerate(zip(events, split_peaks)):
-            for type_ in ["s1", "s2", "alt_s1", "alt_s2"]:
-                type_index = event[f"{type_}_index"]
-                if type_index != -1:
-                    type_area_per_channel = sp["area_per_channel"][type_index]
-                    area_per_channel[f"{type_}_area_per_channel"][event_i] = type_area_per_channel
-                    area_per_channel[f"{type_}_length"][event_i] = sp["length"][type_index]
-                    area_per_channel[f"{type_}_dt"][event_i] = sp["dt"][type_index]
-                    if type_ == "s1":
-                        area_per_channel["s1_n_channels"][event_i] = (
-                            type_area_per_channel > 0
-                        ).sum()
+        peak_i, first, _ = amstrax.peaks_in_events(peaks, events)
+        for type_ in ["s1", "s2", "alt_s1", "alt_s2"]:
+            index = amstrax.event_peak_index(events, f"{type_}_index", peak_i, first)
+            has_peak = index != -1
+            for field in ["area_per_channel", "length", "dt"]:
+                area_per_channel[f"{type_}_{field}"][has_peak] = peaks[field][index[has_peak]]
+            if type_ == "s1":
+                area_per_channel["s1_n_channels"][has_peak] = (
+                    area_per_channel["s1_area_per_channel"][has_peak] > 0
+                ).sum(axis=1)
         for field in ["s1_n_channels", ]:
             n_channel[field] = area_per_channel[field]
         result = {
@@ -27,6 +27,10 @@ export, __all__ = strax.exporter()
                   default=amstrax.tpc_z, infer_type=False,
                   help='Total length of the TPC from the bottom of gate to the '
                        'top of cathode wires [cm]'),
+    strax.Option('fill_events_numba',
+                  default=True, track=False, infer_type=False,
+                  help="Fill the events with the compiled implementation, set to "
+                       "False to use the (slower) python reference implementation"),
 )
 @export
 class EventBasics(strax.Plugin):
@@ -40,14 +44,17 @@ class EventBasics(strax.Plugin):
     alternative S2 is selected as the largest S2 other than main S2
     in the time window [main S1 time, main S1 time + max drift time].
     """
-    __version__ = '1.6'
+    __version__ = '1.7'
 
     depends_on = ('events',
                   'peak_basics',
-                  'peak_positions',)
+                  'peak_positions',
+                  'peak_event_index',)
     provides = 'event_basics'
     data_kind = 'events'
     loop_over = 'events'
+    parallel = 'process'
+    allow_superrun = True
 
     def infer_dtype(self):
         # Basic event properties
@@ -125,7 +132,9 @@ class EventBasics(strax.Plugin):
         
         self.drift_time_max = int(self.max_drift_length / self.electron_drift_velocity)
 
-        
+        self._set_dtype_requirements()
+        self._set_posrec_save()
+        self.copy_fields = self._get_copy_fields()
 
     @staticmethod
     def _get_si_dtypes(peak_properties):
@@ -196,22 +205,175 @@ class EventBasics(strax.Plugin):
             else:
                 buffer[field][:] = np.nan
 
+    def _get_copy_fields(self):
+        """
+        Return a list of (role, event field, peak field) of the peak properties to
+        copy into the events, where role is the column in the result of
+        find_main_alt_peaks (0: main S1, 1: alt S1, 2: main S2, 3: alt S2)
+        """
+        copy_fields = []
+        for s_i in [1, 2]:
+            peak_properties_to_save = [name for name, _, _ in self.peak_properties]
+            if s_i == 2:
+                peak_properties_to_save += self.posrec_save
+            for largest_index, main_or_alt in enumerate(['s', 'alt_s']):
+                role = 2 * (s_i - 1) + largest_index
+                copy_fields += [(role, f'{main_or_alt}{s_i}_{name}', name)
+                                for name in peak_properties_to_save]
+        return copy_fields
+
     def compute(self, events, peaks):
         result = np.zeros(len(events), dtype=self.dtype)
         self.set_nan_defaults(result)
 
-        split_peaks = strax.split_by_containment(peaks, events)
-
         result['time'] = events['time']
         result['endtime'] = events['endtime']
         result['event_number'] = events['event_number']
 
-        self.fill_events(result, events, split_peaks)
+        peak_i, first, last = amstrax.peaks_in_events(peaks, events)
+        if self.config['fill_events_numba']:
+            self.fill_events_compiled(result, events, peaks, peak_i, first, last)
+        else:
+            split_peaks = [peaks[peak_i[f:l]] for f, l in zip(first, last)]
+            self.fill_events(result, events, split_peaks)
         return result
 
-    # If copy_largest_peaks_into_event is ever numbafied, also numbafy this function
+    def fill_events_compiled(self, result_buffer, events, peaks, peak_i, first, last):
+        """
+        Same as fill_events, but the main/alternate peaks are selected for all
+        events at once by find_main_alt_peaks and their properties are copied
+        into the events with one gather per field. The peaks of event i are
+        peaks[peak_i[first[i]:last[i]]], see peaks_in_events.
+        """
+        empty = first == last
+        if np.any(empty):
+            raise ValueError(f'No peaks within event?\n{events[np.argmax(empty)]}')
+
+        largest_peaks = self.find_main_alt_peaks(
+            result_buffer, peaks, peak_i, first, last,
+            self.allow_posts2_s1s,
+            self.event_s1_min_coincidence,
+            self.force_alt_s2_in_max_drift_time,
+            self.force_main_before_alt,
+            self.drift_time_max,
+        )
+
+        for role, event_field, peak_field in self.copy_fields:
+            has_peak = largest_peaks[:, role] != -1
+            result_buffer[event_field][has_peak] = peaks[peak_field][largest_peaks[has_peak, role]]
+
+    @staticmethod
+    @numba.njit(cache=True, nogil=True)
+    def find_main_alt_peaks(result,
+                            peaks,
+                            peak_i,
+                            first,
+                            last,
+                            allow_posts2_s1s,
+                            s1_min_coincidence,
+                            force_alt_s2_in_max_drift_time,
+                            force_main_before_alt,
+                            drift_time_max):
+        """
+        Compiled version of fill_result_i, without the copying of the peak properties.
+
+        The peaks of event i are peaks[peak_i[first[i]:last[i]]]. Sets n_peaks, the
+        peak indices and the event properties of the result and returns the indices
+        in peaks of the main S1, alt S1, main S2 and alt S2 of each event (-1 if
+        there is no such peak). On equal areas, the later peak is taken as the
+        larger one.
+        """
+        largest_peaks = np.full((len(result), 4), -1, dtype=np.int64)
+        for event_i in range(len(result)):
+            res = result[event_i]
+            start, stop = first[event_i], last[event_i]
+            res['n_peaks'] = stop - start
+
+            # Main S2: the largest S2
+            s2 = -1
+            for j in range(start, stop):
+                p = peaks[peak_i[j]]
+                if p['type'] == 2 and (s2 == -1 or p['area'] >= peaks[peak_i[s2]]['area']):
+                    s2 = j
+
+            # Main and alternate S1: the largest two S1s
+            s1, alt_s1 = -1, -1
+            for j in range(start, stop):
+                p = peaks[peak_i[j]]
+                if p['type'] != 1 or p['tight_coincidence'] < s1_min_coincidence:
+                    continue
+                if not allow_posts2_s1s and s2 != -1 and p['time'] >= peaks[peak_i[s2]]['time']:
+                    continue
+                if s1 == -1 or p['area'] >= peaks[peak_i[s1]]['area']:
+                    alt_s1 = s1
+                    s1 = j
+                elif alt_s1 == -1 or p['area'] >= peaks[peak_i[alt_s1]]['area']:
+                    alt_s1 = j
+
+            # Alternate S2: the largest other S2, if required within the max drift time
+            alt_s2 = -1
+            check_drift = force_alt_s2_in_max_drift_time and s1 != -1
+            for j in range(start, stop):
+                p = peaks[peak_i[j]]
+                if p['type'] != 2 or j == s2:
+                    continue
+                if check_drift:
+                    delay = p['center_time'] - peaks[peak_i[s1]]['center_time']
+                    if not (delay > 0 and delay < 1.01 * drift_time_max):
+                        continue
+                if alt_s2 == -1 or p['area'] >= peaks[peak_i[alt_s2]]['area']:
+                    alt_s2 = j
+
+            if (force_main_before_alt and alt_s2 != -1
+                    and peaks[peak_i[alt_s2]]['time'] < peaks[peak_i[s2]]['time']):
+                s2, alt_s2 = alt_s2, s2
+
+            for role, j in enumerate((s1, alt_s1, s2, alt_s2)):
+                if j != -1:
+                    largest_peaks[event_i, role] = peak_i[j]
+            if s1 != -1:
+                res['s1_index'] = s1 - start
+            if alt_s1 != -1:
+                res['alt_s1_index'] = alt_s1 - start
+            if s2 != -1:
+                res['s2_index'] = s2 - start
+            if alt_s2 != -1:
+                res['alt_s2_index'] = alt_s2 - start
+
+            # Event properties, as in set_event_properties
+            if s2 == -1:
+                continue
+            main_s2 = peaks[peak_i[s2]]
+            if s1 != -1:
+                main_s1 = peaks[peak_i[s1]]
+                res['drift_time'] = main_s2['center_time'] - main_s1['center_time']
+                if alt_s1 != -1:
+                    res['alt_s1_interaction_drift_time'] = (
+                            main_s2['center_time'] - peaks[peak_i[alt_s1]]['center_time'])
+                    res['alt_s1_delay'] = peaks[peak_i[alt_s1]]['center_time'] - main_s1['center_time']
+                if alt_s2 != -1:
+                    res['alt_s2_interaction_drift_time'] = (
+                            peaks[peak_i[alt_s2]]['center_time'] - main_s1['center_time'])
+                    res['alt_s2_delay'] = peaks[peak_i[alt_s2]]['center_time'] - main_s2['center_time']
+
+            area_before_main_s2 = np.float32(0)
+            large_s2_before_main_s2 = np.float32(0)
+            for j in range(start, stop):
+                p = peaks[peak_i[j]]
+                if p['time'] >= main_s2['time']:
+                    continue
+                area_before_main_s2 += p['area']
+                if p['type'] == 2 and p['area'] > large_s2_before_main_s2:
+                    large_s2_before_main_s2 = p['area']
+            res['area_before_main_s2'] = area_before_main_s2
+            res['large_s2_before_main_s2'] = large_s2_before_main_s2
+        return largest_peaks
+
     def fill_events(self, result_buffer, events, split_peaks):
-        """Loop over the events and peaks within that event"""
+        """
+        Loop over the events and peaks within that event. This is the
+        reference for fill_events_compiled.
+        """
         for event_i, _ in enumerate(events):
             peaks_in_event_i = split_peaks[event_i]
             n_peaks = len(peaks_in_event_i)
@@ -282,7 +444,7 @@ class EventBasics(strax.Plugin):
                                                    peak_properties_to_save)
 
     @staticmethod
-    @numba.njit
+    @numba.njit(cache=True, nogil=True)
     def find_main_alt_s2(largest_s1s, s2_idx, largest_s2s, drift_time_max):
         """Require alt_s2 happens between main S1 and maximum drift time"""
         if len(largest_s1s) > 0 and len(largest_s2s) > 1:
@@ -298,7 +460,7 @@ class EventBasics(strax.Plugin):
         return s2_idx[:2], largest_s2s[:2]
 
     @staticmethod
-    @numba.njit
+    @numba.njit(cache=True, nogil=True)
     def set_event_properties(result, largest_s1s, largest_s2s, peaks):
         """Get properties like drift time and area before main S2"""
         # Compute drift times only if we have a valid S1-S2 pair
@@ -342,8 +504,6 @@ class EventBasics(strax.Plugin):
         largest_peaks = np.argsort(selected_peaks['area'])[-number_of_peaks:][::-1]
         return selected_peaks[largest_peaks], s_index[largest_peaks]
 
-    # If only we could numbafy this... Unfortunatly we cannot.
-    # Perhaps we could one day consider doing something like strax.copy_to_buffer
     @staticmethod
     def copy_largest_peaks_into_event(result,
                                       largest_s_i,
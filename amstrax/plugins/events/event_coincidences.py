@@ -31,6 +31,7 @@ class EventCoincidences(strax.OverlapWindowPlugin):
     provides = ('event_coincidences',)
     depends_on = ('event_basics', 'peaks_ext',)
     data_kind = "events"
+    allow_superrun = True
 
     __version__ = '1.0'
 
@@ -60,7 +61,7 @@ class EventCoincidences(strax.OverlapWindowPlugin):
         return result
 
     @staticmethod
-    @numba.jit(nopython=True, nogil=True, cache=False)
+    @numba.jit(nopython=True, nogil=True, cache=True)
     def matching_peaks(XAMS_times, ext_times, max_delay):
         """
         Pairs peaks (XAMS) and peaks_ext (external NaI detector) signals with a 2 index method.
@@ -11,6 +11,7 @@ class EventInfo(strax.MergeOnlyPlugin):
                  #   'energy_estimates',
                   ]
     rechunk_on_save = True
+    allow_superrun = True
     provides = 'event_info'
     save_when = strax.SaveWhen.ALWAYS
     __version__ = '0.0.3'
@@ -7,19 +7,25 @@ DEFAULT_POSREC_ALGO = 'corr'
 import strax
 
 export, __all__ = strax.exporter()
+__all__ += ['DRIFT_TIME_OPTIONS']
 
-
-@export
-@strax.takes_config(
-    strax.Option('default_reconstruction_algorithm',
-                 default=DEFAULT_POSREC_ALGO,
-                 help="default reconstruction algorithm that provides (x,y)"),
+# These are also needed in the cuts on the drift time
+DRIFT_TIME_OPTIONS = tuple([
     strax.Option('drift_time_gate',
                  default=3000,
                  help='Drift time belonging to the gate in ns'),
     strax.Option('drift_time_cathode',
                  default=39500,
                  help='Drift time belonging to the cathode in ns'),
+])
+
+
+@export
+@strax.takes_config(
+    strax.Option('default_reconstruction_algorithm',
+                 default=DEFAULT_POSREC_ALGO,
+                 help="default reconstruction algorithm that provides (x,y)"),
+    *DRIFT_TIME_OPTIONS,
     strax.Option('gate_cathode_distance',
                  default=50.5,
                  help='Distance between gate and cathode in mm'),    
@@ -35,8 +41,17 @@ class EventPositions(strax.Plugin):
     """
 
     depends_on = ('event_basics',)
+    parallel = 'process'
+    allow_superrun = True
+
+    __version__ = '1.2.1'
 
-    __version__ = '1.1.20'
+    fdc_map = amstrax.XAMSConfig(
+        default=None,
+        help="Field distortion correction map of the correction to r vs. the observed "
+             "position (x, y, z), as map data or the name of a map file, see "
+             "amstrax.load_map. None for no field distortion correction"
+    )
 
 
     def infer_dtype(self):
@@ -50,7 +65,14 @@ class EventPositions(strax.Plugin):
                 dtype += [(field, np.float32, comment)]
 
         dtype += [('z', np.float32,
-         'Interaction depth z-position')]
+         'Interaction depth z-position'),
+                  ('r_naive', np.float32,
+         'Main interaction r-position without field distortion correction'),
+                  ('z_naive', np.float32,
+         'Interaction depth z-position without field distortion correction'),
+                  ('r_field_distortion_correction', np.float32,
+         'Correction added to r_naive for the field distortion'),
+                  ]
         
         return dtype + strax.time_fields
 
@@ -60,7 +82,14 @@ class EventPositions(strax.Plugin):
         self.drift_time_gate = self.config['drift_time_gate']
         self.drift_time_cathode = self.config['drift_time_cathode']
         self.gate_cathode_distance = self.config['gate_cathode_distance']
-        
+
+        self.fdc = None if self.fdc_map is None else amstrax.load_map(
+            self.fdc_map, branch=amstrax.correction_branch(self.config['fdc_map']))
+
+    def z_from_drift_time(self, drift_time):
+        slope = -self.gate_cathode_distance / (self.drift_time_cathode - self.drift_time_gate)
+        return slope * (drift_time - self.drift_time_gate)
+
     def compute(self, events):
 
         result = {'time': events['time'],
@@ -69,17 +98,45 @@ class EventPositions(strax.Plugin):
         # cope the values from the S2s
         algo = self.default_reconstruction_algorithm
 
-        for j in 'x y'.split():
-            field = f'{j}'
-            result[j] = events[f's2_{j}_{algo}']
-
-            field = f'alt_s2_{j}'
-            result[field] = events[f'alt_s2_{j}_{algo}']
-
-        result['r'] = np.sqrt(result['x'] ** 2 + result['y'] ** 2)
-        result['alt_s2_r'] = np.sqrt(result['alt_s2_x'] ** 2 + result['alt_s2_y'] ** 2)
-
-        slope = -self.gate_cathode_distance / (self.drift_time_cathode - self.drift_time_gate)
-        result['z'] = slope * (events['drift_time'] - self.drift_time_gate)
+        # Observed positions of the main and alternate S2, the latter for
+        # the interaction of the main S1 and alternate S2
+        observed = {
+            'x': events[f's2_x_{algo}'],
+            'y': events[f's2_y_{algo}'],
+            'z': self.z_from_drift_time(events['drift_time']),
+            'alt_s2_x': events[f'alt_s2_x_{algo}'],
+            'alt_s2_y': events[f'alt_s2_y_{algo}'],
+            'alt_s2_z': self.z_from_drift_time(events['alt_s2_interaction_drift_time']),
+        }
+
+        for prefix in ['', 'alt_s2_']:
+            x, y, z = (observed[f'{prefix}{j}'] for j in 'xyz')
+            r = np.sqrt(x ** 2 + y ** 2)
+            if prefix == '':
+                result['r_naive'] = r
+                result['z_naive'] = z
+
+            if self.fdc is None:
+                result[f'{prefix}x'], result[f'{prefix}y'], result[f'{prefix}r'] = x, y, r
+                if prefix == '':
+                    result['z'] = z
+                    result['r_field_distortion_correction'] = np.zeros(len(events))
+                continue
+
+            delta_r = amstrax.interpolate_regular_grid(*self.fdc.grid, self.fdc.points(observed, prefix))
+            r_corrected = np.clip(r + delta_r, 0, None)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                scale = np.where(r > 0, r_corrected / r, 1)
+            result[f'{prefix}x'] = x * scale
+            result[f'{prefix}y'] = y * scale
+            result[f'{prefix}r'] = r_corrected
+
+            if prefix == '':
+                result['r_field_distortion_correction'] = delta_r
+                # The drift path is longer than the depth when electrons are pushed inwards
+                with np.errstate(invalid='ignore'):
+                    z_corrected = np.sign(z) * np.sqrt(z ** 2 - delta_r ** 2)
+                invalid = np.abs(z) < np.abs(delta_r)
+                result['z'] = np.where(invalid, z, z_corrected)
 
         return result
@@ -10,9 +10,11 @@ class EventWaveform(strax.Plugin):
     """Simple plugin that provides total (data) and top (data_top) waveforms for main and
     alternative S1/S2 in the event."""
 
-    depends_on = ("event_basics", "peaks")
+    depends_on = ("event_basics", "peaks", "peak_event_index")
     provides = "event_waveform"
-    __version__ = "0.0.1"
+    parallel = "process"
+    allow_superrun = True
+    __version__ = "0.0.2"
 
     compressor = "zstd"
     save_when = strax.SaveWhen.EXPLICIT
@@ -57,13 +59,10 @@ class EventWaveform(strax.Plugin):
         result["time"] = events["time"]
         result["endtime"] = strax.endtime(events)
 
-        split_peaks = strax.split_by_containment(peaks, events)
-        for event_i, (event, sp) in enumerate(zip(events, split_peaks)):
-            for type_ in ["s1", "s2", "alt_s1", "alt_s2"]:
-                type_index = event[f"{type_}_index"]
-                if type_index != -1:
-                    type_area_per_channel = sp["area_per_channel"][type_index]
-                    result[f"{type_}_length"][event_i] = sp["length"][type_index]
-                    result[f"{type_}_data"][event_i] = sp["data"][type_index]
-                    result[f"{type_}_dt"][event_i] = sp["dt"][type_index]
+        peak_i, first, _ = amstrax.peaks_in_events(peaks, events)
+        for type_ in ["s1", "s2", "alt_s1", "alt_s2"]:
+            index = amstrax.event_peak_index(events, f"{type_}_index", peak_i, first)
+            has_peak = index != -1
+            for field in ["length", "data", "dt"]:
+                result[f"{type_}_{field}"][has_peak] = peaks[field][index[has_peak]]
         return result
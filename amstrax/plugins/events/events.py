@@ -2,6 +2,11 @@ import numba
 import numpy as np
 import strax
 export, __all__ = strax.exporter()
+__all__ += ['EVENT_NUMBER_BITS']
+
+# Event numbers are (chunk_i << EVENT_NUMBER_BITS) + the index of the
+# event in the output of that chunk, see split_event_number
+EVENT_NUMBER_BITS = 32
 
 @export
 @strax.takes_config(
@@ -16,55 +21,203 @@ export, __all__ = strax.exporter()
                       'triggering peak'),
 )
 class Events(strax.OverlapWindowPlugin):
+    """
+    Build events around groups of triggering peaks (S2s above trigger_min_area).
+
+    Triggers less than left_event_extension + right_event_extension apart are
+    grouped, and each group is extended by left_event_extension to the left and
+    right_event_extension to the right to make an event.
+
+    The events are built in a single pass over the chunks: only the trigger
+    group that might still be joined by triggers in the next chunk is kept
+    between chunks, so groups longer than a chunk are not cut. Each chunk
+    returns the events not yet sent out, with that open group as an event up
+    to the end of the chunk. The overlap window keeps the events near the end
+    of the chunk until the next one, and sends out what is left at the end
+    of the run.
+
+    This plugin keeps state between chunks, so it processes the chunks of
+    a run one after another (parallel = False). The plugins that build on
+    the events are stateless and just copy the event_number, so those can
+    process chunks in parallel.
+
+    Event numbers are made from the number of the input chunk and the index
+    of the event in the output for that chunk (see split_event_number), so
+    they increase with time and are unique in the run, but do not need a
+    counter over the run. They are not contiguous, and they depend on how
+    the peaks are chunked: as the peaks are rechunked when they are saved,
+    events built live and events rebuilt from stored peaks have the same
+    times but can have different event_numbers. Use global_event_number for
+    a contiguous number that does not depend on the chunking.
+
+    For superruns (see contexts.define_superrun) the runs are processed as
+    one stream, but events are never built across, or extended beyond, the
+    start and end of each run.
+    """
     depends_on = ['peaks', 
                   'peak_basics',
                   ]
     rechunk_on_save = False
     data_kind = 'events'
     parallel = False
+    allow_superrun = True
     dtype = [
-        ('event_number', np.int64, 'Event number in this dataset'),
+        ('event_number', np.int64,
+         'Event number in this dataset, increasing with time but not contiguous and '
+         'not stable if the peaks are rechunked (see global_event_number)'),
         ('time', np.int64, 'Event start time in ns since the unix epoch'),
         ('endtime', np.int64, 'Event end time in ns since the unix epoch')]
-    events_seen = 0
-    __version__ = '1.0.2'
+    __version__ = '2.2.1'
 
+    def setup(self):
+        # End of the input used so far. The overlap window passes part of
+        # it again with the next chunk, which we skip.
+        self.seen_until = None
+        # (sub)run_id: {'start': ..., 'end': ...} of the new input chunk
+        self.chunk_runs = None
+        # The (sub)run we are building events for, and its [start, end] so far
+        self.current_run = None
+        self.run_range = None
+        # (time, endtime) of the trigger group that may be joined by new triggers
+        self.open_group = None
+        # Complete events that were not sent out yet
+        self.closed_events = np.zeros(0, dtype=self.dtype)
 
     def get_window_size(self):
-        return (2 * self.config['left_event_extension'] +
-                self.config['right_event_extension'])
+        # The overlap window only sends out events ending 2 * left_event_extension
+        # before the end of the chunk. The open group, and the events of
+        # triggers in the next chunk, end later than that. No earlier input
+        # is needed, as the open group is kept here.
+        return 0, self.config['left_event_extension']
+
+    def do_compute(self, chunk_i=None, **kwargs):
+        # The (sub)runs of the new input chunk, before the overlap window
+        # concatenates it with the input it kept. Strax may leave the
+        # subruns of a whole run on the chunks of a superrun, these are
+        # clipped to the chunk so that the chunks can be concatenated.
+        peaks = kwargs['peaks']
+        subruns = peaks.subruns or {self.run_id: {'start': peaks.start, 'end': peaks.end}}
+        self.chunk_runs = {
+            run_id: {'start': max(run['start'], peaks.start), 'end': min(run['end'], peaks.end)}
+            for run_id, run in subruns.items()
+            if run['start'] < peaks.end and peaks.start < run['end']}
+        if peaks.subruns is not None:
+            peaks.subruns = self.chunk_runs
+        return super().do_compute(chunk_i=chunk_i, **kwargs)
 
-    def compute(self, peaks, start, end):
-        le = self.config['left_event_extension']
-        re = self.config['right_event_extension']
+    def compute(self, peaks, start, end, chunk_i):
+        if self.seen_until is not None:
+            peaks = peaks[peaks['time'] >= self.seen_until]
+        self.seen_until = end
 
         triggers = peaks[
             (peaks['type'] == 2) &
             (peaks['area'] > self.config['trigger_min_area'])
             ]
 
-        # Join nearby triggers
-        t0, t1 = strax.find_peak_groups(
-            triggers,
-            gap_threshold=le + re + 1,
-            left_extension=le,
-            right_extension=re)
+        # Events are never built across (sub)runs
+        for run_id, run_range in sorted(self.chunk_runs.items(), key=lambda r: r[1]['start']):
+            if run_id != self.current_run:
+                self._close_group()
+                self.current_run, self.run_range = run_id, [run_range['start'], run_range['end']]
+            self.run_range[1] = run_range['end']
 
-        # Don't extend beyond the chunk boundaries
-        # This will often happen for events near the invalid boundary of the
-        # overlap processing (which should be thrown away)
-        t0 = np.clip(t0, start, end)
-        t1 = np.clip(t1, start, end)
+            in_run = (triggers['time'] >= run_range['start']) & (triggers['time'] < run_range['end'])
+            t0, t1, self.open_group = self.add_triggers(
+                triggers[in_run], self.open_group, run_range['end'])
+            self.closed_events = np.concatenate([self.closed_events, self._make_events(t0, t1)])
 
-        result = np.zeros(len(t0), self.dtype)
-        result['time'] = t0
-        result['endtime'] = t1
-        result['event_number'] = np.arange(len(result)) + self.events_seen
+        # The overlap window sent out the events before sent_until
+        self.closed_events = self.closed_events[self.closed_events['time'] >= self.sent_until]
+
+        events = [self.closed_events]
+        if self.open_group is not None:
+            # This event may still grow with the next chunk, but the
+            # overlap window won't send it out before that
+            events.append(self._make_events(*np.array([self.open_group], dtype=np.int64).T))
+        events = np.concatenate(events)
+        events['event_number'] = (chunk_i << EVENT_NUMBER_BITS) + np.arange(len(events))
+        return events
+
+    def _close_group(self):
+        """Close the open trigger group at the end of the current (sub)run"""
+        if self.open_group is not None:
+            t0, t1 = np.array([self.open_group], dtype=np.int64).T
+            self.closed_events = np.concatenate([self.closed_events, self._make_events(t0, t1)])
+            self.open_group = None
 
-        if not result.size > 0:
-            print("Found chunk without events?!")
+    def add_triggers(self, triggers, open_group, end):
+        """
+        Group the triggers of a chunk ending at end, starting with the open_group
+        left by the previous chunk (or None). Returns the start and end times of
+        the closed trigger groups and the new open group (or None).
+        """
+        time, endtime = triggers['time'], strax.endtime(triggers)
+        if open_group is not None:
+            time = np.concatenate([[open_group[0]], time])
+            endtime = np.concatenate([[open_group[1]], endtime])
 
-        self.events_seen += len(result)
+        gap_threshold = (self.config['left_event_extension']
+                         + self.config['right_event_extension'] + 1)
+        t0, t1 = group_triggers(time, endtime, gap_threshold)
 
+        # The last group is closed only if a trigger in the next chunk cannot join it
+        if len(t0) and end - t1[-1] < gap_threshold:
+            return t0[:-1], t1[:-1], (t0[-1], t1[-1])
+        return t0, t1, None
+
+    def _make_events(self, t0, t1):
+        result = np.zeros(len(t0), self.dtype)
+        # Don't extend beyond the start and end (so far) of the run
+        run_start, run_end = self.run_range
+        result['time'] = np.clip(t0 - self.config['left_event_extension'], run_start, None)
+        result['endtime'] = np.clip(t1 + self.config['right_event_extension'], None, run_end)
         return result
 
+
+@export
+@numba.njit(cache=True, nogil=True)
+def group_triggers(time, endtime, gap_threshold):
+    """
+    Return the start and (maximum) end time of groups of triggers, where a
+    trigger starting gap_threshold or more after the end of the previous
+    triggers starts a new group. As strax.find_peak_groups, without the
+    extensions.
+    """
+    group_time = np.zeros(len(time), dtype=np.int64)
+    group_endtime = np.zeros(len(time), dtype=np.int64)
+    n_groups = 0
+    for i in range(len(time)):
+        if n_groups == 0 or time[i] - group_endtime[n_groups - 1] >= gap_threshold:
+            group_time[n_groups] = time[i]
+            group_endtime[n_groups] = endtime[i]
+            n_groups += 1
+        else:
+            group_endtime[n_groups - 1] = max(group_endtime[n_groups - 1], endtime[i])
+    return group_time[:n_groups], group_endtime[:n_groups]
+
+
+@export
+def split_event_number(event_number):
+    """Return the chunk number and the index in the chunk of event numbers"""
+    event_number = np.asarray(event_number)
+    return event_number >> EVENT_NUMBER_BITS, event_number & ((1 << EVENT_NUMBER_BITS) - 1)
+
+
+@export
+def global_event_number(context, run_id, event_number):
+    """
+    Return the contiguous number (0, 1, 2, ...) in run_id of events with
+    event_number, in order of time. Unlike the event_number, this does not
+    depend on how the peaks were chunked. Loads the event numbers of all
+    events of the run.
+    """
+    run_numbers = context.get_array(run_id, 'events', keep_columns=('event_number',),
+                                    progress_bar=False)['event_number']
+    event_number = np.asarray(event_number)
+    result = np.searchsorted(run_numbers, event_number)
+    found = result < len(run_numbers)
+    found[found] = run_numbers[result[found]] == event_number[found]
+    if not np.all(found):
+        raise ValueError(f"Events {event_number[~found]} are not in the events of {run_id}")
+    return result
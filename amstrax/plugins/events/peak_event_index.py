@@ -0,0 +1,80 @@
+import numba
+import numpy as np
+import strax
+
+export, __all__ = strax.exporter()
+
+
+@export
+class PeakEventIndex(strax.Plugin):
+    """
+    Store for each peak the number of the event that fully contains it, or -1
+    if it is not in an event.
+
+    Event-level plugins can depend on this instead of computing the containment
+    of the peaks in the events themselves, and use peaks_in_events to get the
+    peaks of each event by slicing.
+    """
+    depends_on = ('events', 'peak_basics')
+    provides = 'peak_event_index'
+    data_kind = 'peaks'
+    parallel = 'process'
+    allow_superrun = True
+    __version__ = '0.0.1'
+
+    dtype = strax.time_fields + [
+        ('event_number', np.int64, 'Number of the event containing the peak, -1 if none'),
+    ]
+
+    def compute(self, events, peaks):
+        result = np.zeros(len(peaks), dtype=self.dtype)
+        result['time'] = peaks['time']
+        result['endtime'] = peaks['endtime']
+
+        container_i = strax.fully_contained_in(peaks, events)
+        in_event = container_i != -1
+        result['event_number'] = -1
+        result['event_number'][in_event] = events['event_number'][container_i[in_event]]
+        return result
+
+
+@export
+def peaks_in_events(peaks, events):
+    """
+    Return (peak_i, first, last) such that peaks[peak_i[first[i]:last[i]]] are
+    the peaks of events[i], in time order. Peaks need the event_number of
+    peak_event_index.
+    """
+    peak_i = np.flatnonzero(peaks['event_number'] != -1)
+    first, last = _event_ranges(peaks['event_number'][peak_i], events['event_number'])
+    return peak_i, first, last
+
+
+@export
+def event_peak_index(events, index_field, peak_i, first):
+    """
+    Turn an event-local peak index (e.g. the s1_index of event_basics) into the
+    index in peaks, -1 where the event has no such peak. peak_i and first are
+    those of peaks_in_events.
+    """
+    local_index = events[index_field]
+    has_peak = local_index != -1
+    result = np.full(len(events), -1, dtype=np.int64)
+    result[has_peak] = peak_i[first[has_peak] + local_index[has_peak]]
+    return result
+
+
+@numba.njit(cache=True, nogil=True)
+def _event_ranges(peak_event_number, event_number):
+    """First and last (exclusive) index of each event number in peak_event_number"""
+    first = np.zeros(len(event_number), dtype=np.int64)
+    last = np.zeros(len(event_number), dtype=np.int64)
+    peak_j = 0
+    for event_i in range(len(event_number)):
+        while peak_j < len(peak_event_number) and peak_event_number[peak_j] < event_number[event_i]:
+            peak_j += 1
+        first[event_i] = peak_j
+        while peak_j < len(peak_event_number) and peak_event_number[peak_j] == event_number[event_i]:
+            peak_j += 1
+        last[event_i] = peak_j
+    return first, last
@@ -8,4 +8,7 @@ from . import peak_positions
 from .peak_positions import *
 
 from . import peak_coincidences
-from .peak_coincidences import *
\ No newline at end of file
+from .peak_coincidences import *
+
+from . import peak_sipm_match
+from .peak_sipm_match import *
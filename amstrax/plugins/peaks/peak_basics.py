@@ -75,6 +75,7 @@ class PeakBasics(strax.Plugin):
 
     parallel = "False"
     rechunk_on_save = False
+    allow_superrun = True
     __version__ = "2.1"
     dtype = [
         (('Start time of the peak (ns since unix epoch)',
@@ -181,7 +182,7 @@ class PeakBasics(strax.Plugin):
 
 
     @staticmethod
-    @numba.jit(nopython=True, nogil=True, cache=False)
+    @numba.jit(nopython=True, nogil=True, cache=True)
     def find_n_competing(peaks, window, fraction):
         n = len(peaks)
         t = peaks["time"]
@@ -30,6 +30,7 @@ class PeakCoincidences(strax.OverlapWindowPlugin):
     data_kind = "peaks"
     
     rechunk_on_save = False
+    allow_superrun = True
     __version__ = '1.0'
     
     dtype = [
@@ -53,7 +54,7 @@ class PeakCoincidences(strax.OverlapWindowPlugin):
         return result
 
     @staticmethod
-    @numba.jit(nopython=True, nogil=True, cache=False)
+    @numba.jit(nopython=True, nogil=True, cache=True)
     def matching_peaks(XAMS_times, ext_times, max_delay):
         """
         Pairs peaks (XAMS) and peaks_ext (external NaI detector) signals with a 2 index method.
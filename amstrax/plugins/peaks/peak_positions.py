@@ -24,6 +24,7 @@ DEFAULT_POSREC_ALGO = 'corr'
 class PeakPositions(strax.Plugin):
     depends_on = ('peaks', 'peak_basics')
     rechunk_on_save = False
+    allow_superrun = True
     __version__ = '1.2.26'
     dtype = [
         ('x_cgr', np.float32,
@@ -56,10 +57,30 @@ class PeakPositions(strax.Plugin):
         help="Parameters for a correction function to go from x_cgr to true x and y_cgr to true y"
     )
 
+    pos_rec_x_map = amstrax.XAMSConfig(
+        default=None,
+        help="Map of the true x vs. the peak fields x_cgr and y_cgr (the names of its "
+             "coordinates), as map data or the name of a map file "
+             "(see amstrax.load_map). If given with pos_rec_y_map, it replaces pos_rec_params"
+    )
+
+    pos_rec_y_map = amstrax.XAMSConfig(
+        default=None,
+        help="Map of the true y vs. (x_cgr, y_cgr), see pos_rec_x_map"
+    )
+
     def setup(self):
         
         self.default_reconstruction_algorithm = self.config['default_reconstruction_algorithm']
 
+        self.pos_rec_maps = None
+        if self.pos_rec_x_map is not None and self.pos_rec_y_map is not None:
+            self.pos_rec_maps = (
+                amstrax.load_map(self.pos_rec_x_map,
+                                 branch=amstrax.correction_branch(self.config['pos_rec_x_map'])),
+                amstrax.load_map(self.pos_rec_y_map,
+                                 branch=amstrax.correction_branch(self.config['pos_rec_y_map'])))
+
     def compute(self, peaks):
                 
         result = np.empty(len(peaks), dtype=self.dtype)
@@ -94,14 +115,19 @@ class PeakPositions(strax.Plugin):
         result['r_cgr'] = np.sqrt(result['x_cgr']**2+result['y_cgr']**2)
 
         # correct the x and y cgr positions
-        px = self.pos_rec_params[0]
-        py = self.pos_rec_params[1]
+        if self.pos_rec_maps is not None:
+            for coordinate, itp_map in zip('xy', self.pos_rec_maps):
+                result[f'{coordinate}_corr'] = amstrax.interpolate_regular_grid(
+                    *itp_map.grid, itp_map.points(result))
+        else:
+            px = self.pos_rec_params[0]
+            py = self.pos_rec_params[1]
 
-        rec_function_x = np.poly1d(np.array(px))
-        rec_function_y = np.poly1d(np.array(py))
-        
-        result['x_corr'] = rec_function_x(result['x_cgr'])
-        result['y_corr'] = rec_function_y(result['y_cgr'])
+            rec_function_x = np.poly1d(np.array(px))
+            rec_function_y = np.poly1d(np.array(py))
+
+            result['x_corr'] = rec_function_x(result['x_cgr'])
+            result['y_corr'] = rec_function_y(result['y_cgr'])
         result['r_corr'] = np.sqrt(result['x_corr']**2+result['y_corr']**2)
 
         # set x, y, z to be the values from the default reconstruction algorithm
@@ -0,0 +1,116 @@
+import numba
+import numpy as np
+import strax
+
+export, __all__ = strax.exporter()
+
+
+@export
+@strax.takes_config(
+    strax.Option(
+        "sipm_match_max_delay",
+        default=200,
+        help="Maximum allowed difference between the center times of a TPC peak "
+             "and a SiPM peak to count as a match, in ns",
+    ),
+    strax.Option(
+        "sipm_match_max_peak_duration",
+        default=int(5e4),
+        help="Longest (TPC or SiPM) peak duration in ns for which a match across "
+             "chunk boundaries is guaranteed, sets the overlap window",
+    ),
+)
+class PeakSiPMMatch(strax.OverlapWindowPlugin):
+    """
+    Associate each TPC peak with the SiPM peak that is closest to it in time.
+
+    For every chunk a time index (the SiPM center times in sorted order) is
+    built over peaks_sipm, after which every TPC peak is matched with a binary
+    search, so the matching is O((n + m) log m) for n TPC and m SiPM peaks.
+    A SiPM peak may be matched to more than one TPC peak.
+    """
+
+    provides = ("peak_sipm_match",)
+    depends_on = ("peak_basics", "peak_basics_sipm")
+    data_kind = "peaks"
+
+    rechunk_on_save = False
+    allow_superrun = True
+    __version__ = "0.0.1"
+
+    dtype = [
+        ("time", np.int64, "Start time of the peak (ns since unix epoch)"),
+        ("endtime", np.int64, "End time of the peak (ns since unix epoch)"),
+        ("has_sipm_match", np.bool_, "Whether a SiPM peak was found within the maximum delay"),
+        ("sipm_time", np.int64, "Start time of the matched SiPM peak (ns since unix epoch), -1 if no match"),
+        ("sipm_area", np.float32, "Area of the matched SiPM peak [PE], NaN if no match"),
+        ("sipm_delay", np.int32, "Center time of the matched SiPM peak minus that of the TPC peak [ns]"),
+    ]
+
+    def get_window_size(self):
+        """
+        A peak can only be matched to a SiPM peak in the next (or previous) chunk if
+        their center times are close, but the start of either peak can be up to a
+        full peak duration before its center time.
+        """
+        return int(self.config["sipm_match_max_delay"] + self.config["sipm_match_max_peak_duration"])
+
+    def compute(self, peaks, peaks_sipm):
+        result = np.zeros(len(peaks), dtype=self.dtype)
+        result["time"] = peaks["time"]
+        result["endtime"] = peaks["endtime"]
+
+        match_i = self.match_nearest_in_time(
+            peaks["center_time"],
+            peaks_sipm["center_time"],
+            self.config["sipm_match_max_delay"],
+        )
+        has_match = match_i >= 0
+        matched = peaks_sipm[match_i[has_match]]
+
+        result["has_sipm_match"] = has_match
+        result["sipm_time"] = -1
+        result["sipm_time"][has_match] = matched["time"]
+        result["sipm_area"] = np.nan
+        result["sipm_area"][has_match] = matched["area"]
+        result["sipm_delay"][has_match] = matched["center_time"] - peaks["center_time"][has_match]
+
+        return result
+
+    @staticmethod
+    @numba.njit(cache=True, nogil=True)
+    def match_nearest_in_time(times, other_times, max_delay):
+        """
+        For each of times, return the index of the closest of other_times within
+        max_delay (-1 if there is none). On a tie the earlier one is taken.
+
+        Neither array has to be sorted, other_times is sorted once into a time index
+        that is then searched for every entry of times.
+        """
+        order = np.argsort(other_times, kind="mergesort")
+        sorted_times = other_times[order]
+        n_other = len(sorted_times)
+
+        result = np.full(len(times), -1, dtype=np.int64)
+        for i in range(len(times)):
+            t = times[i]
+            right_i = np.searchsorted(sorted_times, t)
+            left_i = right_i - 1
+            if left_i >= 0:
+                # On equal times take the first one, as for right_i
+                left_i = np.searchsorted(sorted_times, sorted_times[left_i])
+
+            best_i = -1
+            best_delay = max_delay
+            # Only the neighbours of the insertion point can be the closest
+            for j in (left_i, right_i):
+                if j < 0 or j >= n_other:
+                    continue
+                delay = abs(sorted_times[j] - t)
+                if delay <= best_delay and (best_i == -1 or delay < best_delay):
+                    best_i = j
+                    best_delay = delay
+
+            if best_i != -1:
+                result[i] = order[best_i]
+        return result
@@ -14,6 +14,55 @@ HITFINDER_OPTIONS = tuple([
              'See straxen.hit_min_amplitude for options.'
     )])
 
+# Entries of width and area_decile_from_midpoint that are used downstream
+# (by PeakBasics), the only ones computed in the 'light' widths mode
+LIGHT_WIDTHS = (5, 9)
+LIGHT_DECILES = (1,)
+
+
+@export
+def compute_peak_widths(peaks, widths_mode='full'):
+    """
+    Compute the width and area_decile_from_midpoint of peaks (in place),
+    with the same definitions as strax.compute_widths.
+
+    In the 'full' mode all entries are computed, in the 'light' mode only
+    LIGHT_WIDTHS and LIGHT_DECILES, the other entries are set to NaN. Either
+    way the area fractions that are needed are found in a single cumulative
+    pass over the waveform of each peak.
+    """
+    if not len(peaks):
+        return
+    n_widths = peaks['width'].shape[1]
+    n_deciles = peaks['area_decile_from_midpoint'].shape[1]
+    if widths_mode == 'full':
+        widths, deciles = np.arange(n_widths), np.arange(n_deciles)
+    elif widths_mode == 'light':
+        widths, deciles = np.array(LIGHT_WIDTHS), np.array(LIGHT_DECILES)
+    else:
+        raise ValueError(f"Unknown widths mode {widths_mode}, use 'full' or 'light'")
+
+    # The area fractions of strax.compute_widths, with the median at i_mid
+    desired_widths = np.linspace(0, 1, n_widths)[1:]
+    desired_fr = np.concatenate([0.5 - desired_widths / 2, 0.5 + desired_widths / 2])
+    desired_fr = np.sort(np.unique(np.append(desired_fr, [0.5])))
+    i_mid = len(desired_fr) // 2
+    left, right, decile_i = i_mid - widths, i_mid + widths, 2 * deciles
+
+    # Only evaluate the fractions that are needed
+    needed = np.unique(np.concatenate([left, right, decile_i, [i_mid]]))
+    fr_times = np.full((len(peaks), len(desired_fr)), np.nan, dtype=np.float32)
+    fr_times[:, needed] = strax.index_of_fraction(peaks, desired_fr[needed])
+    fr_times[:, needed] *= peaks['dt'].reshape(-1, 1)
+
+    if widths_mode != 'full':
+        peaks['width'] = np.nan
+        peaks['area_decile_from_midpoint'] = np.nan
+    peaks['width'][:, widths] = fr_times[:, right] - fr_times[:, left]
+    peaks['area_decile_from_midpoint'][:, deciles] = fr_times[:, decile_i] - fr_times[:, [i_mid]]
+    if 'median_time' in peaks.dtype.names:
+        peaks['median_time'] = fr_times[:, i_mid]
+
 
 @export
 @strax.takes_config(
@@ -34,7 +83,10 @@ HITFINDER_OPTIONS = tuple([
                  help="Minimum ratio between local sum waveform"
                       "minimum and maxima on either side, to trigger a split"),
     strax.Option('n_tpc_pmts', track=False, default=False,
-                 help="Number of channels")
+                 help="Number of channels"),
+    strax.Option('peak_widths_mode', default='full',
+                 help="Which peak widths to compute: 'full' for all of them or "
+                      "'light' for only those used by peak_basics (others are NaN)"),
 )
 class Peaks(strax.Plugin):
     depends_on = ('records',)
@@ -42,6 +94,7 @@ class Peaks(strax.Plugin):
     parallel = 'process'
     provides = ('peaks')
     rechunk_on_save = True
+    allow_superrun = True
 
     __version__ = '0.1.50'
 
@@ -91,6 +144,6 @@ class Peaks(strax.Plugin):
             min_height=self.config['peak_split_min_height'],
             min_ratio=self.config['peak_split_min_ratio'])
 
-        strax.compute_widths(peaks)
+        compute_peak_widths(peaks, self.config['peak_widths_mode'])
 
         return peaks
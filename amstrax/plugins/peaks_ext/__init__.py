@@ -1,3 +1,6 @@
+from . import subdetector_peaks
+from .subdetector_peaks import *
+
 from . import peaks_ext
 from .peaks_ext import *
 
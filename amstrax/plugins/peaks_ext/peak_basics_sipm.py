@@ -75,7 +75,11 @@ class PeakBasicsSiPM(strax.Plugin):
 
     parallel = "False"
     rechunk_on_save = False
-    __version__ = "2.1"
+    allow_superrun = True
+    __version__ = "2.2"
+
+    subdetector = "sipm"
+
     dtype = [
         (('Start time of the peak (ns since unix epoch)',
           'time'), np.int64),
@@ -126,8 +130,12 @@ class PeakBasicsSiPM(strax.Plugin):
         r['n_hits'] = p['n_hits']
         r['range_50p_area'] = p['width'][:, 5]
         r['range_90p_area'] = p['width'][:, 9]
-        r['max_pmt'] = np.argmax(p['area_per_channel'], axis=1)
-        r['max_pmt_area'] = np.max(p['area_per_channel'], axis=1)
+
+        # Peaks of a subdetector are stored with compact channel indices
+        first_channel, last_channel = self.config['channel_map'][self.subdetector]
+        area_per_channel = p['area_per_channel'][:, :last_channel - first_channel + 1]
+        r['max_pmt'] = np.argmax(area_per_channel, axis=1) + first_channel
+        r['max_pmt_area'] = np.max(area_per_channel, axis=1)
         r['tight_coincidence'] = p['tight_coincidence']
         r['n_saturated_channels'] = p['n_saturated_channels']
 
@@ -164,7 +172,7 @@ class PeakBasicsSiPM(strax.Plugin):
 
 
     @staticmethod
-    @numba.jit(nopython=True, nogil=True, cache=False)
+    @numba.jit(nopython=True, nogil=True, cache=True)
     def find_n_competing(peaks, window, fraction):
         n = len(peaks)
         t = peaks["time"]
@@ -0,0 +1,125 @@
+import numpy as np
+import strax
+from immutabledict import immutabledict
+import amstrax
+
+export, __all__ = strax.exporter()
+
+
+@export
+@strax.takes_config(
+    strax.Option('peak_gap_threshold', default=300,
+                 help="No hits for this many ns triggers a new peak"),
+    strax.Option('peak_left_extension', default=10,
+                 help="Include this many ns left of hits in peaks"),
+    strax.Option('peak_right_extension', default=10,
+                 help="Include this many ns right of hits in peaks"),
+    strax.Option('peak_min_area', default=10,
+                 help="Minimum contributing PMTs needed to define a peak"),
+    strax.Option('peak_split_min_height', default=25,
+                 help="Minimum height in PE above a local sum waveform"
+                      "minimum, on either side, to trigger a split"),
+    strax.Option('peak_split_min_ratio', default=4,
+                 help="Minimum ratio between local sum waveform"
+                      "minimum and maxima on either side, to trigger a split"),
+    strax.Option(
+        "channel_map",
+        type=immutabledict,
+        track=False,
+        help="Map of channel numbers to top, bottom and aqmon, to be defined in the context",
+    ),
+    strax.Option('peak_widths_mode', default='full',
+                 help="Which peak widths to compute: 'full' for all of them or "
+                      "'light' for only those used by peak_basics (others are NaN)"),
+)
+class SubdetectorPeaks(strax.Plugin):
+    """
+    Base class for building peaks of a single subdetector (e.g. the external
+    PMT or the SiPMs) with its own, compact, channel indexing.
+
+    Channel ch of the subdetector is stored at area_per_channel[ch - first_channel],
+    where first_channel is the first channel of the subdetector in the channel_map.
+    Subclasses set the subdetector and implement compute by calling build_peaks.
+    """
+    subdetector: str
+
+    parallel = 'process'
+    rechunk_on_save = True
+    allow_superrun = True
+
+    gain_to_pe_array = amstrax.XAMSConfig(
+        default=None,
+        help="Gain to pe array"
+    )
+
+    @property
+    def first_channel(self):
+        return self.config['channel_map'][self.subdetector][0]
+
+    @property
+    def n_channels(self):
+        first, last = self.config['channel_map'][self.subdetector]
+        return last - first + 1
+
+    def infer_dtype(self):
+        # strax does not allow peaks with a single channel
+        return strax.peak_dtype(n_channels=max(self.n_channels, 2))
+
+    def setup(self):
+        self.to_pe = self.subdetector_to_pe(self.gain_to_pe_array)
+
+    def subdetector_to_pe(self, gain_to_pe_array):
+        """
+        Return the gains of the channels of this subdetector, in the compact
+        channel indexing. The gains may be given for all channels of the
+        detector or for only those of this subdetector.
+        """
+        n_compact = max(self.n_channels, 2)
+        to_pe = np.ones(n_compact, dtype=np.float64)
+        if gain_to_pe_array is None:
+            return to_pe
+
+        gains = np.asarray(gain_to_pe_array, dtype=np.float64)
+        if len(gains) == self.n_channels:
+            to_pe[:self.n_channels] = gains
+        elif len(gains) >= self.first_channel + self.n_channels:
+            to_pe[:self.n_channels] = gains[self.first_channel:self.first_channel + self.n_channels]
+        else:
+            raise ValueError(
+                f"gain_to_pe_array has {len(gains)} entries, which is neither the "
+                f"number of {self.subdetector} channels ({self.n_channels}) nor enough "
+                f"to include channel {self.first_channel + self.n_channels - 1}")
+        return to_pe
+
+    def build_peaks(self, records):
+        """Find hits and build peaks for the records of this subdetector"""
+        r = records
+
+        hits = strax.find_hits(r)
+        hits = strax.sort_by_time(hits)
+        # Move to the compact channel indexing, records are linked per
+        # channel so they can keep the detector channel numbers
+        hits['channel'] -= self.first_channel
+
+        rlinks = strax.record_links(r)
+
+        peaks = strax.find_peaks(
+            hits, self.to_pe,
+            gap_threshold=self.config['peak_gap_threshold'],
+            left_extension=self.config['peak_left_extension'],
+            right_extension=self.config['peak_right_extension'],
+            min_area=self.config['peak_min_area'],
+            min_channels=1,
+            result_dtype=self.dtype,
+        )
+
+        strax.sum_waveform(peaks, hits, r, rlinks, self.to_pe)
+
+        peaks = strax.split_peaks(
+            peaks, hits, r, rlinks, self.to_pe,
+            min_height=self.config['peak_split_min_height'],
+            min_ratio=self.config['peak_split_min_ratio'])
+
+        amstrax.compute_peak_widths(peaks, self.config['peak_widths_mode'])
+
+        return peaks
@@ -0,0 +1,322 @@
+import datetime
+import os
+import re
+import socket
+import sqlite3
+
+import strax
+from bson import ObjectId, json_util
+
+export, __all__ = strax.exporter()
+__all__ += ["RUN_CATALOG_ENV", "CATALOG_FIELDS", "FINGERPRINT_FIELDS"]
+
+# Path of the run catalog for the jobs, see RunCatalog
+RUN_CATALOG_ENV = "AMSTRAX_RUN_CATALOG"
+
+# Fields of the run documents that are kept in the catalog
+CATALOG_FIELDS = (
+    "name", "number", "mode", "start", "end", "user", "comments", "tags", "source",
+    "reader", "data", "processing_status", "processing_failed",
+)
+
+# Fields that are edited after a run was started, and the fields that
+# identify a data entry. RunCatalog.sync regularly fetches these of all
+# runs, and fetches the documents in which they changed.
+FINGERPRINT_FIELDS = (
+    "mode", "source", "tags", "comments", "end", "processing_status", "processing_failed",
+    "data.type", "data.host", "data.location", "data.lineage_hash", "data.time",
+)
+
+# Fields that change when a run document is updated, to find changed
+# documents by time (see changed_since_query)
+MODIFIED_FIELDS = ("end", "processing_status.time", "data.time")
+# Documents changed this long before the last sync are fetched again, as
+# the times in the rundb are not all in UTC
+SYNC_OVERLAP = datetime.timedelta(days=1)
+
+_schema = """
+CREATE TABLE IF NOT EXISTS runs (
+    number INTEGER PRIMARY KEY,
+    name TEXT,
+    oid TEXT,
+    fingerprint TEXT,
+    doc TEXT
+);
+CREATE TABLE IF NOT EXISTS data (
+    number INTEGER,
+    type TEXT,
+    host TEXT,
+    lineage_hash TEXT,
+    protocol TEXT,
+    location TEXT,
+    in_output_folder INTEGER
+);
+CREATE INDEX IF NOT EXISTS data_by_run ON data (number, type);
+CREATE INDEX IF NOT EXISTS data_by_type ON data (type, lineage_hash);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+@export
+class RunCatalog:
+    """
+    Local replica of the run collection in an SQLite file, with the fields
+    of the run documents that we use (CATALOG_FIELDS) and their data entries.
+
+    sync() brings it up to date with the rundb. Normally it only fetches
+    the runs that were added or changed (see changed_since_query) since the
+    last sync, and lists the _ids of all runs to remove the runs that were
+    removed from the rundb. Every full_sync_interval it reconciles the whole
+    catalog: it fetches the small FINGERPRINT_FIELDS of all runs, and the
+    whole documents of runs in which these changed, which also picks up
+    edits that do not change a time (like tags). Reading the catalog does
+    not need a connection to the rundb, see RunCatalogFrontend.
+    """
+
+    # Seconds between the syncs that compare the fingerprints of all runs
+    full_sync_interval = 24 * 3600
+
+    def __init__(self, path, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        if readonly:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"No run catalog at {path}")
+            self.connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True,
+                                              check_same_thread=False)
+        else:
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.executescript(_schema)
+
+    def sync(self, collection, full=False, batch_size=1000):
+        """
+        Fetch new and changed run documents from collection (e.g.
+        get_mongo_collection()) and remove runs that are gone. full
+        compares the fingerprints of all runs now, instead of only when
+        full_sync_interval has passed.
+
+        :return: the number of fetched documents
+        """
+        if self.readonly:
+            raise PermissionError(f"Run catalog {self.path} is read-only")
+        started_at = _utcnow()
+        last_sync, last_full_sync = self._get_time("last_sync"), self._get_time("last_full_sync")
+        stored_oids = [oid for (oid,) in self.connection.execute("SELECT oid FROM runs")]
+        full = (full or last_sync is None or last_full_sync is None or not stored_oids
+                or started_at - last_full_sync > datetime.timedelta(seconds=self.full_sync_interval))
+
+        if full:
+            stored = dict(self.connection.execute("SELECT oid, fingerprint FROM runs"))
+            current = {doc["_id"]: _fingerprint(doc) for doc in collection.find(
+                {}, projection=list(FINGERPRINT_FIELDS), batch_size=batch_size)}
+            changed = [oid for oid, fingerprint in current.items()
+                       if stored.get(str(oid)) != fingerprint]
+            fetched = (doc for i in range(0, len(changed), batch_size)
+                       for doc in collection.find({"_id": {"$in": changed[i:i + batch_size]}},
+                                                  projection=list(CATALOG_FIELDS),
+                                                  batch_size=batch_size))
+        else:
+            current = [doc["_id"] for doc in collection.find(
+                {}, projection=["_id"], batch_size=batch_size)]
+            last_oid = max(ObjectId(oid) for oid in stored_oids)
+            fetched = collection.find(changed_since_query(last_oid, last_sync - SYNC_OVERLAP),
+                                      projection=list(CATALOG_FIELDS), batch_size=batch_size)
+        removed = set(stored_oids) - set(str(oid) for oid in current)
+
+        n_docs = 0
+        with self.connection:
+            for oid in removed:
+                self.connection.execute(
+                    "DELETE FROM data WHERE number IN (SELECT number FROM runs WHERE oid = ?)", (oid,))
+                self.connection.execute("DELETE FROM runs WHERE oid = ?", (oid,))
+            for doc in fetched:
+                self._store(doc)
+                n_docs += 1
+            self._set_state("last_sync", started_at)
+            if full:
+                self._set_state("last_full_sync", started_at)
+        return n_docs
+
+    def _store(self, doc):
+        number = int(doc["number"])
+        self.connection.execute("DELETE FROM data WHERE number = ?", (number,))
+        self.connection.execute(
+            "INSERT OR REPLACE INTO runs (number, name, oid, fingerprint, doc) VALUES (?, ?, ?, ?, ?)",
+            (number, doc.get("name"), str(doc["_id"]), _fingerprint(doc),
+             json_util.dumps({k: v for k, v in doc.items() if k != "_id"})))
+        self.connection.executemany(
+            "INSERT INTO data VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(number, datum.get("type"), datum.get("host"), _lineage_hash(datum),
+              datum.get("protocol", strax.FileSytemBackend.__name__), datum.get("location"),
+              int("lineage_hash" in datum))
+             for datum in doc.get("data", [])])
+
+    def _get_time(self, key):
+        """The (naive UTC) time stored under key, or None"""
+        row = self.connection.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return None if row is None else json_util.loads(row[0]).replace(tzinfo=None)
+
+    def _set_state(self, key, value):
+        self.connection.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?)",
+                                (key, json_util.dumps(value)))
+
+    def run_doc(self, run_id):
+        """The run document of run_id, or None if it is not in the catalog"""
+        row = self.connection.execute("SELECT doc FROM runs WHERE number = ?",
+                                      (int(run_id),)).fetchone()
+        return None if row is None else json_util.loads(row[0])
+
+    def run_docs(self):
+        """All run documents, ordered by run number"""
+        for (doc,) in self.connection.execute("SELECT doc FROM runs ORDER BY number"):
+            yield json_util.loads(doc)
+
+    def find_data(self, run_id, key: strax.DataKey, hosts):
+        """(protocol, location) of the data of key on one of hosts, or None"""
+        row = self.connection.execute(
+            f"SELECT protocol, location, in_output_folder FROM data "
+            f"WHERE number = ? AND type = ? AND lineage_hash = ? "
+            f"AND host IN ({','.join('?' * len(hosts))}) LIMIT 1",
+            (int(run_id), key.data_type, key.lineage_hash, *hosts)).fetchone()
+        if row is None:
+            return None
+        protocol, location, in_output_folder = row
+        if in_output_folder:
+            # The processing scripts register the output folder, not the data
+            location = os.path.join(location, str(key))
+        return protocol, location
+
+    def runs_with_data(self, key: strax.DataKey, hosts):
+        """Run numbers with the data of key on one of hosts"""
+        return [number for (number,) in self.connection.execute(
+            f"SELECT DISTINCT number FROM data WHERE type = ? AND lineage_hash = ? "
+            f"AND host IN ({','.join('?' * len(hosts))}) ORDER BY number",
+            (key.data_type, key.lineage_hash, *hosts))]
+
+    def close(self):
+        self.connection.close()
+
+
+@export
+def changed_since_query(last_oid, last_sync):
+    """
+    Query for the run documents added after the document with ObjectId
+    last_oid, or changed (see MODIFIED_FIELDS) after the time last_sync.
+    """
+    return {"$or": [{"_id": {"$gt": last_oid}}]
+            + [{field: {"$gt": last_sync}} for field in MODIFIED_FIELDS]}
+
+
+def _fingerprint(doc):
+    """The FINGERPRINT_FIELDS of a run document, as a string to compare"""
+    fields = [field for field in FINGERPRINT_FIELDS if "." not in field]
+    data_fields = [field.split(".")[1] for field in FINGERPRINT_FIELDS if field.startswith("data.")]
+    fingerprint = {field: doc[field] for field in fields if field in doc}
+    fingerprint["data"] = [{k: v for k, v in datum.items() if k in data_fields}
+                           for datum in doc.get("data", [])]
+    return json_util.dumps(fingerprint, sort_keys=True)
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _lineage_hash(datum):
+    """Lineage hash of a data entry of the RunDB frontend or of the processing scripts"""
+    if "lineage_hash" in datum:
+        return datum["lineage_hash"]
+    lineage = datum.get("meta", {}).get("lineage")
+    if lineage is None:
+        return None
+    return strax.deterministic_hash(lineage)
+
+
+@export
+class RunCatalogFrontend(strax.StorageFrontend):
+    """
+    Read-only frontend for the run metadata and data locations in a
+    RunCatalog, which works like RunDB without a connection to the rundb.
+    """
+
+    # Dict of alias used in rundb: regex on hostname, like RunDB.hosts. The
+    # processing scripts register the first part of the hostname (stbc or
+    # wn), and the stoomboot nodes share the storage of the data.
+    hosts = {
+        'dali': r'^dali.*rcc.*',
+        'stbc': r'^(stbc|wn)-',
+        'wn': r'^(stbc|wn)-',
+    }
+
+    provide_run_metadata = True
+
+    def __init__(self, path=None, hosts=None, reader_ini_name_is_mode=False, *args, **kwargs):
+        """
+        :param path: path of the catalog, by default from AMSTRAX_RUN_CATALOG
+        :param hosts: hosts of the data to find, by default this host, the
+            name under which the processing scripts register it, and its
+            aliases in RunCatalogFrontend.hosts
+        :param reader_ini_name_is_mode: see RunDB
+
+        Other (kw)args are passed to StorageFrontend.__init__
+        """
+        kwargs.setdefault('readonly', True)
+        super().__init__(*args, **kwargs)
+        self.readonly = True
+        path = path or os.environ.get(RUN_CATALOG_ENV)
+        if not path:
+            raise ValueError(f"No run catalog given, and {RUN_CATALOG_ENV} is not set")
+        self.catalog = RunCatalog(path, readonly=True)
+        self.reader_ini_name_is_mode = reader_ini_name_is_mode
+        self.backends = [strax.FileSytemBackend()]
+
+        if hosts is None:
+            hostnames = [socket.getfqdn(), socket.gethostname()]
+            hosts = [hostnames[0], hostnames[1].split('-')[0]] + [
+                alias for alias, regex in self.hosts.items()
+                if any(re.match(regex, hostname) for hostname in hostnames)]
+            hosts = list(dict.fromkeys(hosts))
+        self.available_hosts = list(strax.to_str_tuple(hosts))
+
+    def _find(self, key: strax.DataKey,
+              write, allow_incomplete, fuzzy_for, fuzzy_for_options):
+        if fuzzy_for or fuzzy_for_options:
+            raise NotImplementedError("Can't do fuzzy with the run catalog.")
+        if write:
+            raise strax.DataNotAvailable
+        found = self.catalog.find_data(key.run_id, key, self.available_hosts)
+        if found is None:
+            raise strax.DataNotAvailable
+        return found
+
+    def _list_available(self, key: strax.DataKey,
+                        allow_incomplete, fuzzy_for, fuzzy_for_options):
+        if fuzzy_for or fuzzy_for_options:
+            raise NotImplementedError("Can't do fuzzy with the run catalog.")
+        return [f'{number:06d}' for number in self.catalog.runs_with_data(key, self.available_hosts)]
+
+    def _scan_runs(self, store_fields):
+        for doc in self.catalog.run_docs():
+            yield _project(self._with_mode(doc), list(store_fields) + ['mode'])
+
+    def run_metadata(self, run_id, projection=None):
+        doc = self.catalog.run_doc(run_id)
+        if doc is None:
+            raise strax.DataNotAvailable
+        doc = self._with_mode(doc)
+        if projection is not None:
+            doc = _project(doc, list(projection))
+        return doc
+
+    def _with_mode(self, doc):
+        if self.reader_ini_name_is_mode:
+            doc['mode'] = doc.get('reader', {}).get('ini', {}).get('name', '')
+        return doc
+
+
+def _project(doc, fields):
+    """doc with only the (top-level parents of the) fields"""
+    fields = set(field.split('.')[0] for field in strax.to_str_tuple(fields))
+    return {k: v for k, v in doc.items() if k in fields}
@@ -1,3 +1,4 @@
+import numpy as np
 import strax
 import typing as ty
 from strax import Config
@@ -8,37 +9,33 @@ import amstrax
 export, __all__ = strax.exporter()
 
 
+# Correction values fetched in this process, by (config name, url, run_id)
+_correction_values = dict()
+
+
 @export
 class XAMSConfig(Config):
     """A configuration class that fetches corrections from JSON files."""
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self._cached_value = None  # Initialize cache for the fetched value
-
     def fetch(self, plugin):
         """
         Overrides the fetch method to load corrections from JSON or CMT files.
         Handles both 'cmt://' and 'file://' URLs. Otherwise, returns default.
         """
-
-        # Check if the value has already been cached
-        if self._cached_value is not None:
-            return self._cached_value
-
         config_value = plugin.config.get(self.name, self.default)
 
         # Check if the config is a cmt URL or file URL
-        if isinstance(config_value, str):
-            if config_value.startswith("cmt://"):
-                self._cached_value = self._fetch_from_cmt(plugin, config_value)
-            elif config_value.startswith("file://"):
-                self._cached_value = self._fetch_from_file_url(plugin, config_value)
-        else:
-            # Cache the default value if no URL is provided
-            self._cached_value = config_value
+        if not isinstance(config_value, str) or not config_value.startswith(("cmt://", "file://")):
+            return config_value
 
-        return self._cached_value
+        # Corrections depend on the run, so values are cached per run
+        key = (self.name, config_value, plugin.run_id)
+        if key not in _correction_values:
+            if config_value.startswith("cmt://"):
+                _correction_values[key] = self._fetch_from_cmt(plugin, config_value)
+            else:
+                _correction_values[key] = self._fetch_from_file_url(plugin, config_value)
+        return _correction_values[key]
 
     def _fetch_from_cmt(self, plugin, config_value):
         """Fetch correction from a cmt:// URL."""
@@ -47,7 +44,7 @@ class XAMSConfig(Config):
         parsed_url = urlparse(config_value)
         query_params = parse_qs(parsed_url.query)
         run_id = plugin.run_id
-        github_branch = query_params.get("github_branch", ["master"])[0]
+        github_branch = correction_branch(config_value)
         version = query_params.get("version", [None])[0]
         if not version:
             raise ValueError(f"Invalid cmt:// URL, missing version: {config_value}")
@@ -55,17 +52,17 @@ class XAMSConfig(Config):
         print(f"Fetching correction {version} for {correction_key} and run_id {run_id} using branch {github_branch}")
 
         # Retrieve the global corrections file
-        corrections = amstrax.get_correction(f"_global_{version}.json", branch=github_branch)
+        corrections = global_corrections(version, branch=github_branch)
 
         # Get the specific file for this correction (e.g., 'elife_v0.json')
         correction_file = corrections.get(correction_key)
         if not correction_file:
             raise ValueError(f"No correction file found for {correction_key} and run_id {run_id}")
 
-        # Load the correction data (e.g., {'001200': 5500, '001300': 6000})
-        correction_data = amstrax.get_correction(correction_file, branch=github_branch)
+        # The index of the correction data (e.g., {'001200': 5500, '001300': 6000})
+        index = self._correction_index(correction_file, github_branch, run_id)
 
-        value = self.find_correction_value(correction_data, run_id)
+        value = self.value_for_run(index, run_id)
 
         return value
 
@@ -77,54 +74,150 @@ class XAMSConfig(Config):
         filename = query_params.get("filename", [None])[0]
         run_id = plugin.run_id
 
-        github_branch = query_params.get("github_branch", ["master"])[0]
+        github_branch = correction_branch(config_value)
 
         self.filename = filename
 
         if not filename:
             raise ValueError(f"Invalid file:// URL, missing filename: {config_value}")
 
-        # Retrieve the specific correction file (e.g., 'elife_v0.json')
-        correction_data = amstrax.get_correction(filename, branch=github_branch)
+        # The index of the specific correction file (e.g., 'elife_v0.json')
+        index = self._correction_index(filename, github_branch, run_id)
 
         # Find the correction value based on the run_id
-        value = self.find_correction_value(correction_data, run_id)
+        value = self.value_for_run(index, run_id)
 
         return value
 
+    @staticmethod
+    def _correction_index(file_name, branch, run_id):
+        """Index of the correction file, from the corrections table in use if it has run_id"""
+        table = amstrax.active_corrections_table()
+        if table is not None and table.has(file_name, branch, amstrax.contexts.subrun_ids(run_id)):
+            return table.index(file_name)
+        return correction_index(file_name, branch=branch)
+
     def find_correction_value(self, correction_data, run_id):
-        run_id = run_id.zfill(6)  # Ensure run_id is always 6 digits
-        value = None
-
-        for run_range in correction_data.keys():
-            if "-" in run_range:
-                start_run, end_run = run_range.split("-")
-                start_run = start_run.zfill(6)
-                if end_run == "*":
-                    # Only allow * for online corrections
-                    # check if there is _dev in the filename
-                    if "_dev" not in self.filename:
-                        raise ValueError(f"Wildcard '*' is only allowed for online corrections")
-                    end_run = "999999"  # Treat * as the highest possible run ID
-
-                if start_run == "*":
-                    # Only allow * for online corrections
-                    # check if there is _dev in the filename
-                    if "_dev" not in self.filename:
-                        raise ValueError(f"Wildcard '*' is only allowed for online corrections")
-                    start_run = "000000"
-
-                end_run = end_run.zfill(6)
-
-                if start_run <= run_id <= end_run:
-                    value = correction_data[run_range]
-                    break
-            else:
-                if run_range.zfill(6) == run_id:
-                    value = correction_data[run_range]
-                    break
+        # Only allow * for online corrections, check if there is _dev in the filename
+        allow_wildcards = "_dev" in (getattr(self, "filename", None) or "")
+        return self.value_for_run(CorrectionIntervalIndex(correction_data, allow_wildcards), run_id)
 
-        if value is None:
-            raise ValueError(f"No valid correction found for run_id {run_id} and no fallback is allowed.")
+    def value_for_run(self, index, run_id):
+        """The value of the CorrectionIntervalIndex for run_id, which may be a superrun"""
+        subruns = amstrax.contexts.subrun_ids(run_id)
+        values = [index.value_for_run(subrun) for subrun in subruns]
+        if len(subruns) > 1 and any(value != values[0] for value in values):
+            # A superrun, which needs the same correction for all of its runs
+            raise ValueError(f"Correction {self.name} changes within superrun {run_id}, "
+                             f"split it where the correction changes.")
+        return values[0]
 
-        return value
+
+@export
+def correction_branch(config_value):
+    """
+    Branch of the corrections repository a correction option is fetched
+    from: the github_branch of a cmt:// or file:// URL, otherwise master.
+    Files an option refers to (e.g. maps, see load_map) come from the same branch.
+    """
+    if not isinstance(config_value, str) or not config_value.startswith(("cmt://", "file://")):
+        return "master"
+    return parse_qs(urlparse(config_value).query).get("github_branch", ["master"])[0]
+
+
+# Indices of the correction files, by (branch, file name)
+_correction_indices = dict()
+
+
+@export
+def global_corrections(version, branch="master"):
+    """The global corrections file of version, from the corrections table in use if it has it"""
+    table = amstrax.active_corrections_table()
+    if table is not None:
+        corrections = table.global_corrections_for(version, branch)
+        if corrections is not None:
+            return corrections
+    return amstrax.correction_client().prefetch_global_version(version, branch=branch)
+
+
+@export
+def correction_index(file_name, branch="master"):
+    """The CorrectionIntervalIndex of a correction file, compiled once per process"""
+    key = (branch, file_name)
+    if key not in _correction_indices:
+        _correction_indices[key] = CorrectionIntervalIndex(
+            amstrax.get_correction(file_name, branch=branch),
+            # Only allow * for online corrections
+            allow_wildcards="_dev" in file_name)
+    return _correction_indices[key]
+
+
+@export
+class CorrectionIntervalIndex:
+    """
+    Index of a correction file, which maps runs or run ranges to values, e.g.
+        {'001200': 5500, '001201-001300': 6000, '001301-*': 6100}
+    The ranges are inclusive. '*' (as start or end of a range) is only
+    allowed for online corrections (allow_wildcards).
+
+    The ranges are sorted and checked for overlaps once, after which the
+    value of a run is found by bisection.
+    """
+    max_run = 999999
+
+    def __init__(self, correction_data, allow_wildcards=False):
+        ranges = sorted((self._parse_range(run_range, allow_wildcards), value)
+                        for run_range, value in correction_data.items())
+        self.starts = np.array([start for (start, _), _ in ranges], dtype=np.int64)
+        self.ends = np.array([end for (_, end), _ in ranges], dtype=np.int64)
+        self.values = np.empty(len(ranges), dtype=object)
+        self.values[:] = [value for _, value in ranges]
+
+        overlap = np.flatnonzero(self.starts[1:] <= self.ends[:-1])
+        if len(overlap):
+            i = overlap[0]
+            raise ValueError(f"Overlapping run ranges {self.starts[i]}-{self.ends[i]} and "
+                             f"{self.starts[i + 1]}-{self.ends[i + 1]} in corrections")
+
+    def _parse_range(self, run_range, allow_wildcards):
+        if "-" not in run_range:
+            return int(run_range), int(run_range)
+        start_run, end_run = run_range.split("-")
+        if "*" in (start_run, end_run) and not allow_wildcards:
+            raise ValueError(f"Wildcard '*' is only allowed for online corrections")
+        start_run = 0 if start_run == "*" else int(start_run)
+        end_run = self.max_run if end_run == "*" else int(end_run)
+        if end_run < start_run:
+            raise ValueError(f"Invalid run range {run_range} in corrections")
+        return start_run, end_run
+
+    def value_for_run(self, run_id):
+        """The value for run_id (a run number or string), as it is in the correction file"""
+        return self._lookup([run_id])[0]
+
+    def values_for_runs(self, run_ids, fill_value=None):
+        """
+        The values for all run_ids, as an array (of floats if all values are
+        numbers). Raises a ValueError for runs without a value, unless
+        fill_value is given.
+        """
+        values = self._lookup(run_ids, fill_value)
+        if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+            return values.astype(np.float64)
+        return values
+
+    def _lookup(self, run_ids, fill_value=None):
+        runs = np.array([int(run_id) for run_id in run_ids], dtype=np.int64)
+        values = np.full(len(runs), None, dtype=object)
+        if len(self.starts):
+            i = np.clip(np.searchsorted(self.starts, runs, side="right") - 1, 0, None)
+            in_range = (runs >= self.starts[i]) & (runs <= self.ends[i])
+            values[in_range] = self.values[i[in_range]]
+
+        missing = np.array([value is None for value in values], dtype=np.bool_)
+        if np.any(missing):
+            if fill_value is None:
+                raise ValueError(f"No valid correction found for run_id {runs[missing][0]:06d} "
+                                 f"and no fallback is allowed.")
+            values[missing] = fill_value
+        return values
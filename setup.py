@@ -41,7 +41,7 @@ setuptools.setup(name='amstrax',
                  tests_require=tests_requires,
                  python_requires=">=3.6",
                  packages=setuptools.find_packages(),
-                 scripts=['bin/process_run'],
+                 scripts=['bin/process_run', 'bin/amstrax_warmup'],
                  classifiers=[
                      'Development Status :: 4 - Beta',
                      'License :: OSI Approved :: BSD License',
@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import amstrax
+
+
+class TestColumnar(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.export_dir = self.tempdir.name
+        self.runs = dict()
+        for run_i, run_id in enumerate(['000001', '000002', '000003']):
+            data = np.zeros(100, dtype=[('time', np.int64), ('cs1', np.float32),
+                                        ('is_coinc', np.bool_), ('waveform', np.float32, 4)])
+            data['time'] = np.arange(100) + 1000 * run_i
+            data['cs1'] = np.linspace(0, 100, 100) + 1000 * run_i
+            data['cs1'][::10] = np.nan
+            data['is_coinc'] = data['time'] % 2 == 0
+            amstrax.write_columnar(data, os.path.join(self.export_dir, 'event_info', run_id))
+            self.runs[run_id] = data
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_load_all(self):
+        self.assertEqual(amstrax.exported_runs(self.export_dir, 'event_info'), list(self.runs))
+        result = amstrax.load_columnar(self.export_dir, 'event_info')
+        expected = np.concatenate(list(self.runs.values()))
+        for column in expected.dtype.names:
+            np.testing.assert_array_equal(result[column], expected[column])
+        self.assertEqual(result['run_id'][-1], '000003')
+
+    def test_pushdown(self):
+        result = amstrax.load_columnar(self.export_dir, 'event_info', columns=['time'],
+                                       where=['cs1 < 1050', ('is_coinc', '==', True)])
+        self.assertEqual(result.dtype.names, ('time', 'run_id'))
+        expected = np.concatenate(list(self.runs.values()))
+        expected = expected[(expected['cs1'] < 1050) & expected['is_coinc']]
+        np.testing.assert_array_equal(result['time'], expected['time'])
+
+        # The third run cannot pass, so it is not opened
+        os.remove(os.path.join(self.export_dir, 'event_info', '000003', 'cs1.npy'))
+        result = amstrax.load_columnar(self.export_dir, 'event_info', where='cs1 < 1050')
+        self.assertEqual(set(result['run_id']), {'000001', '000002'})
+
+
+if __name__ == '__main__':
+    unittest.main()
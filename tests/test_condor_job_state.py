@@ -0,0 +1,29 @@
+from amstrax.auto_processing_new.job_submission import CondorJobState
+
+
+def test_condor_job_state():
+    queries = []
+
+    def query():
+        queries.append(1)
+        return [
+            dict(ClusterId=1, ProcId=0, JobStatus=2, JobBatchName='process_016001_online'),
+            dict(ClusterId=2, ProcId=0, JobStatus=4, JobBatchName='process_006002_online'),
+            # Submitted without a batch name
+            dict(ClusterId=3, ProcId=0, JobStatus=5, Cmd='/logs/process_006003_online.sh'),
+        ]
+
+    job_state = CondorJobState(query)
+    assert job_state.is_active('process_016001_online')
+    assert not job_state.is_active('process_006001_online')
+    assert not job_state.is_active('process_006002_online')
+    assert job_state.is_active('process_006003_online')
+    assert len(queries) == 1
+
+
+def test_condor_job_state_fail_safe():
+    def query():
+        raise RuntimeError('condor_q command failed')
+
+    assert CondorJobState(query).is_active('process_006001_online')
+    assert not CondorJobState(query, fail_safe=False).ok
@@ -0,0 +1,57 @@
+import unittest
+
+import numpy as np
+import strax
+
+import amstrax
+
+
+class TestCorrectedAreas(unittest.TestCase):
+
+    def _plugin_and_events(self, **config):
+        st = amstrax.contexts.xams(init_rundb=False)
+        st.set_config(config)
+        plugin = st.get_single_plugin('000000', 'corrected_areas')
+        events = np.zeros(100, dtype=strax.merged_dtype(
+            [plugin.deps[d].dtype_for(d) for d in plugin.depends_on]))
+        rng = np.random.default_rng(0)
+        for field in ['s1_area', 'alt_s1_area', 's2_area', 'alt_s2_area']:
+            events[field] = rng.exponential(100, len(events))
+        events['drift_time'] = rng.uniform(0, 40_000, len(events))
+        events['z'] = rng.uniform(-50, 0, len(events))
+        for field in ['x', 'y', 'alt_s2_x', 'alt_s2_y']:
+            events[field] = rng.uniform(-3, 3, len(events))
+        return plugin, events
+
+    def test_without_maps(self):
+        plugin, events = self._plugin_and_events()
+        result = plugin.compute(events)
+
+        zmin, zmax, y0, a = plugin.s1_naive_z_correction
+        s1_correction = (y0 + a * (zmin + zmax) / 2) / (y0 + a * events['z'])
+        elife_correction = np.exp(events['drift_time'] / plugin.elife)
+        for prefix in ['', 'alt_']:
+            np.testing.assert_allclose(result[f'{prefix}cs1'],
+                                       events[f'{prefix}s1_area'] * s1_correction, rtol=1e-6)
+            np.testing.assert_allclose(result[f'{prefix}cs2'],
+                                       events[f'{prefix}s2_area'] * elife_correction, rtol=1e-6)
+
+    def test_with_maps(self):
+        s1_map = {'coordinate_system': [['z', [-50, 0, 2]]], 'map': [0.5, 1.5]}
+        s2_map = {'coordinate_system': [['x', [-3, 3, 2]], ['y', [-3, 3, 2]]],
+                  'map': [[2., 2.], [2., 2.]]}
+        plugin, events = self._plugin_and_events()
+        plugin_maps, _ = self._plugin_and_events(s1_xyz_map=s1_map, s2_xy_map=s2_map)
+        result = plugin.compute(events)
+        result_maps = plugin_maps.compute(events)
+
+        s1_light_yield = 0.5 + (events['z'] + 50) / 50
+        for prefix in ['', 'alt_']:
+            np.testing.assert_allclose(result_maps[f'{prefix}cs1'],
+                                       result[f'{prefix}cs1'] / s1_light_yield, rtol=1e-6)
+            np.testing.assert_allclose(result_maps[f'{prefix}cs2'],
+                                       result[f'{prefix}cs2'] / 2, rtol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
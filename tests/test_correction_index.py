@@ -0,0 +1,36 @@
+import unittest
+
+import numpy as np
+
+import amstrax
+
+
+class TestCorrectionIntervalIndex(unittest.TestCase):
+
+    def test_lookup(self):
+        index = amstrax.CorrectionIntervalIndex(
+            {'1201-1300': 6000, '001200': 5500, '1400-*': [1, 2]}, allow_wildcards=True)
+        self.assertEqual(index.value_for_run('001200'), 5500)
+        self.assertEqual(index.value_for_run(1300), 6000)
+        self.assertEqual(index.value_for_run('999999'), [1, 2])
+        with self.assertRaises(ValueError):
+            index.value_for_run('001350')
+
+        values = index.values_for_runs(['1199', '1200', '1250', '1350'], fill_value=np.nan)
+        self.assertEqual(len(values), 4)
+        self.assertTrue(np.isnan(values[0]) and np.isnan(values[3]))
+        self.assertEqual(values[1], 5500)
+
+        index = amstrax.CorrectionIntervalIndex({'1-10': 1, '11-20': 2})
+        np.testing.assert_array_equal(index.values_for_runs(np.arange(1, 21)),
+                                      np.repeat([1., 2.], 10))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            amstrax.CorrectionIntervalIndex({'1-10': 1, '10-20': 2})
+        with self.assertRaises(ValueError):
+            amstrax.CorrectionIntervalIndex({'1-*': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
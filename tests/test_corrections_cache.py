@@ -0,0 +1,122 @@
+import http.server
+import json
+import threading
+
+import pytest
+import strax
+
+import amstrax
+from amstrax import corrections_services
+
+
+@pytest.fixture
+def github(tmp_path, monkeypatch):
+    """A fake GitHub with a single elife file, which counts the requests"""
+    monkeypatch.setenv(amstrax.CORRECTIONS_CACHE_DIR_ENV, str(tmp_path))
+    monkeypatch.delenv(amstrax.CORRECTIONS_OFFLINE_ENV, raising=False)
+    monkeypatch.setattr(corrections_services, '_fetched', dict())
+    files = {'elife/elife_v0.json': {'000001-000010': 1000, '000011-000020': 2000}}
+    requests = []
+
+    def fetch(self, file_name, branch='master', etag=None):
+        requests.append((file_name, etag))
+        content = json.dumps(files[file_name]).encode()
+        new_etag = f'"{hash(content)}"'
+        if etag == new_etag:
+            return None, etag
+        return content, new_etag
+
+    monkeypatch.delenv(amstrax.CORRECTIONS_URL_ENV, raising=False)
+    monkeypatch.setattr(amstrax.CorrectionClient, 'fetch', fetch)
+    return files, requests
+
+
+def _new_process(monkeypatch):
+    monkeypatch.setattr(corrections_services, '_fetched', dict())
+
+
+def test_disk_cache(github, monkeypatch):
+    files, requests = github
+    expected = files['elife/elife_v0.json']
+    assert amstrax.get_correction('elife_v0.json') == expected
+    assert amstrax.get_correction('elife_v0.json') == expected
+    assert len(requests) == 1
+
+    # Revalidated through the ETag in a new process
+    _new_process(monkeypatch)
+    assert amstrax.get_correction('elife_v0.json') == expected
+    assert requests[-1][1] is not None
+
+    # Offline only the cache is used
+    monkeypatch.setenv(amstrax.CORRECTIONS_OFFLINE_ENV, '1')
+    _new_process(monkeypatch)
+    assert amstrax.get_correction('elife_v0.json') == expected
+    assert len(requests) == 2
+    with pytest.raises(FileNotFoundError):
+        amstrax.get_correction('elife_v1.json')
+
+    # Changed files are downloaded again
+    monkeypatch.delenv(amstrax.CORRECTIONS_OFFLINE_ENV)
+    _new_process(monkeypatch)
+    files['elife/elife_v0.json'] = {'000001-000020': 3000}
+    assert amstrax.get_correction('elife_v0.json') == {'000001-000020': 3000}
+
+
+def test_values_per_run(github):
+    class ElifePlugin(strax.Plugin):
+        provides = 'elife_test'
+        depends_on = ('corrected_areas',)
+        dtype = strax.time_fields
+        test_elife = amstrax.XAMSConfig(default='file://test_elife?filename=elife_v0.json')
+
+    st = amstrax.contexts.xams(init_rundb=False)
+    st.register(ElifePlugin)
+    assert st.get_single_plugin('000005', 'elife_test').test_elife == 1000
+    assert st.get_single_plugin('000015', 'elife_test').test_elife == 2000
+    assert st.get_single_plugin('000005', 'elife_test').test_elife == 1000
+
+
+@pytest.fixture
+def mirror(tmp_path, monkeypatch):
+    """A local mirror of the corrections with a global version"""
+    monkeypatch.setattr(corrections_services, '_fetched', dict())
+    files = {'_global/_global_v9.json': {'elife': 'elife_v9.json', 'drift_velocity': 1.5},
+             'elife/elife_v9.json': {'000001-000010': 1000}}
+    for file_name, content in files.items():
+        path = tmp_path / 'master' / 'corrections' / file_name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(content))
+    return str(tmp_path / '{branch}' / 'corrections'), files
+
+
+def test_local_mirror(mirror, monkeypatch):
+    base_url, files = mirror
+    monkeypatch.setenv(amstrax.CORRECTIONS_URL_ENV, base_url)
+
+    st = amstrax.contexts.xams(init_rundb=False, corrections_version='v9')
+    assert st.config['elife'] == 'file://elife?filename=elife_v9.json&github_branch=master'
+    # Everything was fetched while making the context
+    assert set(corrections_services._fetched) == {('master', f) for f in files}
+    assert amstrax.get_correction('elife_v9.json') == files['elife/elife_v9.json']
+
+
+def test_http_mirror(mirror):
+    base_url, files = mirror
+    root = base_url.split('{branch}')[0]
+
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=root, **kwargs)
+
+        def log_message(self, *args):
+            pass
+
+    with http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler) as server:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        client = amstrax.CorrectionClient(
+            f'http://127.0.0.1:{server.server_address[1]}/{{branch}}/corrections/')
+        content, _ = client.fetch('elife/elife_v9.json')
+        assert json.loads(content) == files['elife/elife_v9.json']
+        with pytest.raises(FileNotFoundError):
+            client.fetch('elife/elife_v10.json')
+        server.shutdown()
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+import amstrax
+from amstrax import corrections_services, corrections_table, xams_config
+
+
+@pytest.fixture
+def mirror(tmp_path, monkeypatch):
+    """A local mirror of the corrections with a single global version"""
+    files = {
+        '_global/_global_v9.json': {'elife': 'elife_v9.json'},
+        'elife/elife_v9.json': {'000001-000010': 1000, '000011-000020': 2000},
+    }
+    for file_name, content in files.items():
+        path = tmp_path / 'mirror' / 'master' / file_name
+        path.parent.mkdir(parents=True)
+        path.write_text(json.dumps(content))
+    monkeypatch.setenv(amstrax.CORRECTIONS_URL_ENV, str(tmp_path / 'mirror' / '{branch}'))
+    monkeypatch.delenv(amstrax.CORRECTIONS_TABLE_ENV, raising=False)
+    for module, name in [(corrections_services, '_fetched'),
+                         (xams_config, '_correction_indices'),
+                         (xams_config, '_correction_values')]:
+        monkeypatch.setattr(module, name, dict())
+    monkeypatch.setattr(corrections_table, '_active_table', dict(table=None, set=False))
+    return tmp_path
+
+
+def test_corrections_table(mirror, monkeypatch):
+    table = amstrax.CorrectionsTable.resolve(['5', '000012'], 'v9')
+    assert table.values == {'elife_v9.json': {'000005': 1000, '000012': 2000}}
+    path = str(mirror / 'corrections_v9.json')
+    table.to_file(path)
+
+    # The jobs only need the table, not the corrections themselves
+    monkeypatch.setenv(amstrax.CORRECTIONS_URL_ENV, str(mirror / 'nowhere'))
+    monkeypatch.setattr(corrections_services, '_fetched', dict())
+    monkeypatch.setattr(xams_config, '_correction_indices', dict())
+    monkeypatch.setenv(amstrax.CORRECTIONS_TABLE_ENV, path)
+
+    st = amstrax.contexts.xams(init_rundb=False, corrections_version='v9')
+    assert st.get_single_plugin('000012', 'corrected_areas').elife == 2000
+    assert st.get_single_plugin('000005', 'corrected_areas').elife == 1000
+
+    # Runs outside of the table are fetched as usual
+    with pytest.raises(FileNotFoundError):
+        st.get_single_plugin('000007', 'corrected_areas').elife
+
+
+def test_unresolved_runs(mirror):
+    """Runs without a value are left out of the table, and not the whole campaign"""
+    with pytest.warns(UserWarning, match='000030'):
+        table = amstrax.CorrectionsTable.resolve(['5', '30'], 'v9')
+    assert table.values == {'elife_v9.json': {'000005': 1000}}
+    assert table.has('elife_v9.json', 'master', ['000005'])
+    assert not table.has('elife_v9.json', 'master', ['000030'])
+
+    amstrax.use_corrections_table(None)
+    assert amstrax.active_corrections_table() is None
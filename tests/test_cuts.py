@@ -0,0 +1,42 @@
+import unittest
+
+import numpy as np
+
+import amstrax
+
+
+class TestCuts(unittest.TestCase):
+
+    def setUp(self):
+        self.st = amstrax.contexts.xams(init_rundb=False)
+
+    def test_cuts_basic(self):
+        cuts_basic = self.st.get_single_plugin('000000', 'cuts_basic')
+        self.assertIn('cut_s1_area', cuts_basic.dtype.names)
+        self.assertNotIn('cut_coincidence', cuts_basic.dtype.names)
+        for name in amstrax.CUT_REGISTRY:
+            self.assertIn(name, self.st._plugin_class_registry)
+
+    def test_cut_by(self):
+        self.st.set_config({'cut_s1_area_range': (10, 100)})
+        plugin = self.st.get_single_plugin('000000', 'cut_s1_area')
+        events = np.zeros(4, dtype=plugin.deps['event_basics'].dtype)
+        events['s1_area'] = [5, 10, 99, np.nan]
+        result = plugin.compute(events=events)
+        np.testing.assert_array_equal(result['cut_s1_area'], [False, True, True, False])
+
+    def test_drift_time_options(self):
+        """The drift time cut uses the same gate and cathode as the positions"""
+        self.st.set_config({'drift_time_gate': 2000, 'drift_time_cathode': 30000})
+        plugin = self.st.get_single_plugin('000000', 'cut_drift_time')
+        positions = self.st.get_single_plugin('000000', 'event_positions')
+        for option in ['drift_time_gate', 'drift_time_cathode']:
+            self.assertEqual(plugin.config[option], positions.config[option])
+        events = np.zeros(4, dtype=plugin.deps['event_basics'].dtype)
+        events['drift_time'] = [1999, 2000, 30000, 30001]
+        result = plugin.compute(events=events)
+        np.testing.assert_array_equal(result['cut_drift_time'], [False, True, True, False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import time
+
+import pymongo
+
+from amstrax.auto_processing_new import db_utils
+
+
+class FakeCollection:
+    def __init__(self):
+        self.bulk_writes = []
+
+    def bulk_write(self, operations, ordered=True):
+        assert not ordered
+        self.bulk_writes.append(operations)
+        return pymongo.results.BulkWriteResult({'nModified': len(operations)}, True)
+
+
+def test_writer_coalesces(monkeypatch):
+    collection = FakeCollection()
+    writer = db_utils.RunDBWriter(collection, max_pending=10, max_delay=1000)
+    monkeypatch.setattr(db_utils, '_writer', dict(writer=writer))
+
+    db_utils.update_processing_status(1, 'running', production=True, is_online=True)
+    db_utils.update_processing_status(1, 'failed', reason='oops', production=True, is_online=True)
+    db_utils.update_processing_status(1, 'failed', reason='oops', production=True, is_online=True)
+    db_utils.update_processing_status(2, 'done', production=True, is_online=True)
+    db_utils.add_data_entry(1, 'peaks', '/data', 'stbc', 1, 1., 'abcdefghij', production=True)
+    # Dry runs are not written
+    db_utils.update_processing_status(3, 'done', production=False)
+    assert not collection.bulk_writes
+
+    assert db_utils.flush_writes() == 3
+    (status_1, status_2, data_entry), = collection.bulk_writes
+    assert status_1._doc['$set']['processing_status']['status'] == 'failed'
+    assert status_1._doc['$inc'] == {'processing_failed': 2}
+    assert status_2._doc.keys() == {'$set'}
+    assert data_entry._filter['data']['$not']['$elemMatch']['lineage_hash'] == 'abcdefghij'
+    assert db_utils.flush_writes() == 0
+
+    # Flushed when there are max_pending updates
+    for run_id in range(10):
+        db_utils.update_processing_status(run_id, 'done', production=True, is_online=True)
+    assert len(collection.bulk_writes) == 2
+
+
+class FailingCollection(FakeCollection):
+    """Fails the first n_failures writes, as if the rundb cannot be reached"""
+
+    def __init__(self, n_failures):
+        super().__init__()
+        self.n_failures = n_failures
+
+    def bulk_write(self, operations, ordered=True):
+        if self.n_failures:
+            self.n_failures -= 1
+            raise pymongo.errors.ServerSelectionTimeoutError('no rundb')
+        return super().bulk_write(operations, ordered)
+
+
+def test_failed_writes_are_kept():
+    collection = FailingCollection(n_failures=1)
+    writer = db_utils.RunDBWriter(collection, max_pending=2, max_delay=1000)
+    writer.queue_status(1, {'status': 'done'})
+    # This flushes, which fails, but does not raise
+    writer.queue_data_entry(1, dict(type='peaks', location='/data', lineage_hash='abc'))
+    assert not collection.bulk_writes
+    assert writer.n_pending == 2
+
+    assert writer.flush() == 2
+    assert len(collection.bulk_writes[0]) == 2
+    assert writer.n_pending == 0
+
+
+def test_flushed_after_max_delay():
+    collection = FakeCollection()
+    writer = db_utils.RunDBWriter(collection, max_pending=10, max_delay=0.1)
+    writer.queue_status(1, {'status': 'done'})
+    time.sleep(0.5)
+    assert len(collection.bulk_writes) == 1
+    assert writer.n_pending == 0
@@ -0,0 +1,112 @@
+import unittest
+
+import numpy as np
+import strax
+
+import amstrax
+
+
+class TestFillEvents(unittest.TestCase):
+    """Filling of the events in EventBasics, from the peaks in each event"""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        st = amstrax.contexts.xams(init_rundb=False)
+        cls.plugin = st.get_single_plugin('000000', 'event_basics')
+        cls.index_plugin = st.get_single_plugin('000000', 'peak_event_index')
+        cls.events_dtype = st.get_single_plugin('000000', 'events').dtype_for('events')
+        cls.apc_plugin = st.get_single_plugin('000000', 'event_area_per_channel')
+        cls.peaks_dtype = strax.merged_dtype(
+            [st.get_single_plugin('000000', d).dtype_for(d)
+             for d in ('peaks',) + cls.plugin.depends_on[1:]])
+
+    def _events_and_peaks(self, n_events=100, seed=0):
+        rng = np.random.default_rng(seed)
+        n_peaks = rng.integers(1, 10, n_events)
+        peaks = np.zeros(n_peaks.sum(), dtype=self.peaks_dtype)
+        for name in peaks.dtype.names:
+            if np.issubdtype(peaks.dtype[name], np.floating):
+                peaks[name] = rng.normal(0, 10, len(peaks))
+        peaks['time'] = np.cumsum(rng.integers(10, 10_000, len(peaks)))
+        peaks['endtime'] = peaks['time'] + rng.integers(1, 10, len(peaks))
+        peaks['center_time'] = peaks['time'] + 1
+        peaks['type'] = rng.integers(0, 3, len(peaks))
+        peaks['area'] = rng.exponential(100, len(peaks))
+        peaks['tight_coincidence'] = rng.integers(0, 4, len(peaks))
+
+        peaks['event_number'] = np.repeat(np.arange(n_events), n_peaks)
+
+        events = np.zeros(n_events, dtype=self.events_dtype)
+        last_peak = np.cumsum(n_peaks) - 1
+        events['time'] = peaks['time'][last_peak - n_peaks + 1]
+        events['endtime'] = peaks['endtime'][last_peak]
+        events['event_number'] = np.arange(n_events)
+
+        # Some peaks extending beyond the end of their event
+        outside = rng.random(len(peaks)) < 0.1
+        outside[last_peak - n_peaks + 1] = False
+        outside[last_peak] = False
+        peaks['endtime'][outside] = events['endtime'][peaks['event_number'][outside]] + 1
+        peaks['event_number'][outside] = -1
+        return events, peaks
+
+    def test_peaks_in_events(self):
+        events, peaks = self._events_and_peaks()
+        np.testing.assert_array_equal(
+            self.index_plugin.compute(events, peaks)['event_number'],
+            peaks['event_number'])
+
+        peak_i, first, last = amstrax.peaks_in_events(peaks, events)
+        for event_i, sp in enumerate(strax.split_by_containment(peaks, events)):
+            np.testing.assert_array_equal(peaks[peak_i[first[event_i]:last[event_i]]], sp)
+
+    def test_event_area_per_channel(self):
+        events, peaks = self._events_and_peaks()
+        rng = np.random.default_rng(1)
+        peaks['area_per_channel'] = rng.exponential(1, peaks['area_per_channel'].shape)
+        peaks['area_per_channel'][peaks['area_per_channel'] < 0.5] = 0
+        peaks['dt'] = rng.integers(1, 10, len(peaks))
+        events = strax.merge_arrs([events, self.plugin.compute(events, peaks)])
+
+        result = self.apc_plugin.compute(events, peaks)['event_area_per_channel']
+        split_peaks = strax.split_by_containment(peaks, events)
+        for type_ in ["s1", "s2", "alt_s1", "alt_s2"]:
+            for event, sp, res in zip(events, split_peaks, result):
+                type_index = event[f"{type_}_index"]
+                if type_index == -1:
+                    continue
+                np.testing.assert_array_equal(res[f"{type_}_area_per_channel"],
+                                              sp["area_per_channel"][type_index])
+                self.assertEqual(res[f"{type_}_dt"], sp["dt"][type_index])
+                if type_ == "s1":
+                    self.assertEqual(res["s1_n_channels"],
+                                     np.sum(sp["area_per_channel"][type_index] > 0))
+
+    def _compare(self, **options):
+        events, peaks = self._events_and_peaks()
+        for name, value in options.items():
+            setattr(self.plugin, name, value)
+
+        results = []
+        for fill_events_numba in (False, True):
+            self.plugin.config['fill_events_numba'] = fill_events_numba
+            results.append(self.plugin.compute(events, peaks))
+
+        reference, compiled = results
+        for name in reference.dtype.names:
+            np.testing.assert_allclose(reference[name], compiled[name], rtol=1e-6,
+                                       err_msg=f'{name} with {options}')
+
+    def test_default_options(self):
+        self._compare()
+
+    def test_options(self):
+        self._compare(allow_posts2_s1s=True,
+                      force_main_before_alt=True,
+                      force_alt_s2_in_max_drift_time=False,
+                      event_s1_min_coincidence=2)
+        self._compare(drift_time_max=10_000)
+
+
+if __name__ == '__main__':
+    unittest.main()
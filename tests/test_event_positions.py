@@ -0,0 +1,62 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import amstrax
+
+
+class TestEventPositions(unittest.TestCase):
+
+    def test_field_distortion_correction(self):
+        st = amstrax.contexts.xams(init_rundb=False)
+        plugin = st.get_single_plugin('000000', 'event_positions')
+        events = np.zeros(100, dtype=plugin.deps['event_basics'].dtype_for('event_basics'))
+        rng = np.random.default_rng(0)
+        algo = plugin.default_reconstruction_algorithm
+        for prefix in ['', 'alt_']:
+            events[f'{prefix}s2_x_{algo}'] = rng.uniform(-3, 3, len(events))
+            events[f'{prefix}s2_y_{algo}'] = rng.uniform(-3, 3, len(events))
+        # Including interactions above the gate (drift_time < drift_time_gate)
+        events['drift_time'] = rng.uniform(0, 30000, len(events))
+        events['alt_s2_interaction_drift_time'] = events['drift_time']
+        naive = plugin.compute(events)
+
+        # A map that moves everything 1 outwards
+        plugin.fdc = amstrax.RegularGridMap(
+            {'coordinate_system': [['x', [-3, 3, 2]], ['y', [-3, 3, 2]], ['z', [-60, 0, 2]]],
+             'map': np.ones((2, 2, 2))})
+        corrected = plugin.compute(events)
+
+        for prefix in ['', 'alt_s2_']:
+            np.testing.assert_allclose(corrected[f'{prefix}r'], naive[f'{prefix}r'] + 1, rtol=1e-6)
+            np.testing.assert_allclose(np.arctan2(corrected[f'{prefix}y'], corrected[f'{prefix}x']),
+                                       np.arctan2(naive[f'{prefix}y'], naive[f'{prefix}x']), rtol=1e-6)
+        above_gate = naive['z'] > 0
+        self.assertTrue(np.any(above_gate & (np.abs(naive['z']) > 1)))
+        valid = np.abs(naive['z']) >= 1
+        np.testing.assert_allclose(corrected['z'][valid],
+                                   np.sign(naive['z'][valid]) * np.sqrt(naive['z'][valid] ** 2 - 1),
+                                   rtol=1e-6)
+        np.testing.assert_array_equal(corrected['z'][~valid], naive['z'][~valid])
+        np.testing.assert_array_equal(corrected['z_naive'], naive['z'])
+
+    def test_map_branch(self):
+        """The map is loaded from the branch of the corrections in use"""
+        run_id = '000000'
+        config_value = 'file://fdc_map?filename=fdc_map_index_v0.json&github_branch=dev'
+        self.assertEqual(amstrax.correction_branch(config_value), 'dev')
+        self.assertEqual(amstrax.correction_branch('fdc_map_v0.json'), 'master')
+
+        st = amstrax.contexts.xams(init_rundb=False)
+        st.set_config(dict(fdc_map=config_value))
+        # As if the option was fetched from the corrections
+        fetched = {('fdc_map', config_value, run_id): 'fdc_map_v0.json'}
+        with mock.patch.dict(amstrax.xams_config._correction_values, fetched), \
+                mock.patch.object(amstrax, 'load_map') as load_map:
+            st.get_single_plugin(run_id, 'event_positions')
+        load_map.assert_called_once_with('fdc_map_v0.json', branch='dev')
+
+
+if __name__ == '__main__':
+    unittest.main()
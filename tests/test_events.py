@@ -0,0 +1,174 @@
+import tempfile
+import unittest
+
+import numpy as np
+import strax
+from immutabledict import immutabledict
+
+import amstrax
+
+
+def fake_peaks_plugin(chunks, dtypes):
+    """Plugin providing peaks and peak_basics from (start, end, peaks) chunks"""
+
+    class FakePeaks(strax.Plugin):
+        depends_on = ()
+        provides = ('peaks', 'peak_basics')
+        data_kind = immutabledict(peaks='peaks', peak_basics='peaks')
+        rechunk_on_save = False
+
+        def infer_dtype(self):
+            return dtypes
+
+        def is_ready(self, chunk_i):
+            return chunk_i < len(chunks)
+
+        def source_finished(self):
+            return True
+
+        def compute(self, chunk_i):
+            start, end, peaks = chunks[chunk_i]
+            result = dict()
+            for data_type, dtype in dtypes.items():
+                result[data_type] = np.zeros(len(peaks), dtype=dtype)
+                for field in result[data_type].dtype.names:
+                    result[data_type][field] = peaks[field]
+                result[data_type] = self.chunk(start=start, end=end, data=result[data_type],
+                                               data_type=data_type)
+            return result
+
+    return FakePeaks
+
+
+class TestEvents(unittest.TestCase):
+    """Building events should not depend on how the peaks are chunked"""
+
+    run_id = '000001'
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        st = amstrax.contexts.xams(init_rundb=False)
+        cls.plugin = st.get_single_plugin(cls.run_id, 'events')
+        cls.le = cls.plugin.config['left_event_extension']
+        cls.re = cls.plugin.config['right_event_extension']
+        cls.dtypes = {d: st.get_single_plugin(cls.run_id, d).dtype_for(d)
+                      for d in ['peaks', 'peak_basics']}
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def _peaks(self, n=2000, seed=0):
+        rng = np.random.default_rng(seed)
+        peaks = np.zeros(n, dtype=strax.merged_dtype(list(self.dtypes.values())))
+        # Clusters of peaks, both closer and further apart than the event extensions
+        gaps = np.where(rng.random(n) < 0.8,
+                        rng.integers(1, 1000, n),
+                        rng.integers(1, 5 * (self.le + self.re), n))
+        peaks['time'] = int(1e9) + np.cumsum(gaps) + np.arange(n) * 100
+        peaks['length'] = rng.integers(1, 100, n)
+        peaks['dt'] = 1
+        peaks['endtime'] = peaks['time'] + peaks['length']
+        peaks['type'] = rng.integers(0, 3, n)
+        peaks['area'] = rng.exponential(20, n)
+        return peaks
+
+    def _context(self, chunks):
+        st = amstrax.contexts.xams(init_rundb=False)
+        st.storage = [strax.DataDirectory(self.tempdir.name)]
+        st.register(fake_peaks_plugin(chunks, self.dtypes))
+        return st
+
+    def _build(self, peaks, run_start, chunk_ends):
+        """Make events from peaks in chunks ending at chunk_ends"""
+        chunks = []
+        start = run_start
+        for end in chunk_ends:
+            in_chunk = (peaks['time'] >= start) & (peaks['time'] < end)
+            chunks.append((start, end, peaks[in_chunk]))
+            start = end
+        st = self._context(chunks)
+        st.make(self.run_id, 'events', progress_bar=False)
+        self.assertTrue(st.is_stored(self.run_id, 'events'))
+
+        # Output chunks should be contiguous and cover the run
+        metadata = st.get_metadata(self.run_id, 'events')
+        for chunk, next_chunk in zip(metadata['chunks'][:-1], metadata['chunks'][1:]):
+            self.assertEqual(chunk['end'], next_chunk['start'])
+        self.assertEqual(metadata['chunks'][0]['start'], run_start)
+        self.assertEqual(metadata['chunks'][-1]['end'], chunk_ends[-1])
+
+        events = st.get_array(self.run_id, 'events', progress_bar=False)
+        # Event numbers increase, and come from at most one more chunk than the input
+        self.assertTrue(np.all(np.diff(events['event_number']) > 0))
+        chunk_i, _ = amstrax.split_event_number(events['event_number'])
+        self.assertTrue(np.all(chunk_i <= len(chunks)))
+        # The global event numbers are contiguous, also for a selection of events
+        np.testing.assert_array_equal(
+            amstrax.global_event_number(st, self.run_id, events['event_number']),
+            np.arange(len(events)))
+        np.testing.assert_array_equal(
+            amstrax.global_event_number(st, self.run_id, events['event_number'][1::3]),
+            np.arange(len(events))[1::3])
+        if len(events):
+            with self.assertRaises(ValueError):
+                amstrax.global_event_number(st, self.run_id, [events['event_number'][-1] + 1])
+        return events
+
+    def test_chunking_invariance(self):
+        peaks = self._peaks()
+        run_start, run_end = peaks['time'][0] - self.le // 2, strax.endtime(peaks)[-1] + 1
+        single = self._build(peaks, run_start, [run_end])
+        self.assertTrue(len(single) > 10)
+
+        # The same as the non-incremental grouping
+        triggers = peaks[(peaks['type'] == 2)
+                         & (peaks['area'] > self.plugin.config['trigger_min_area'])]
+        t0, t1 = strax.find_peak_groups(triggers, self.le + self.re + 1, self.le, self.re)
+        np.testing.assert_array_equal(single['time'], np.clip(t0, run_start, None))
+        np.testing.assert_array_equal(single['endtime'], np.clip(t1, None, run_end))
+
+        rng = np.random.default_rng(1)
+        for n_chunks in [2, 10, 100]:
+            self.tempdir.cleanup()
+            self.tempdir = tempfile.TemporaryDirectory()
+            # Chunks may only end between peaks
+            gaps = np.flatnonzero(strax.endtime(peaks)[:-1] <= peaks['time'][1:])
+            chunk_ends = np.sort(rng.choice(peaks['time'][1:][gaps], n_chunks, replace=False))
+            chunk_ends = np.append(np.unique(chunk_ends), run_end)
+            events = self._build(peaks, run_start, chunk_ends)
+            for field in ['time', 'endtime']:
+                np.testing.assert_array_equal(events[field], single[field])
+
+    def test_long_trigger_group(self):
+        """A group of triggers longer than many chunks is one event"""
+        peaks = self._peaks(n=200)
+        peaks['time'] = int(1e9) + np.arange(len(peaks)) * self.le // 2
+        peaks['endtime'] = peaks['time'] + peaks['length']
+        peaks['type'] = 2
+        peaks['area'] = 1000
+        run_end = strax.endtime(peaks)[-1] + 1
+        chunk_ends = np.append(peaks['time'][10::10], run_end)
+        events = self._build(peaks, peaks['time'][0], chunk_ends)
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events['time'][0], peaks['time'][0])
+        self.assertEqual(events['endtime'][0], run_end)
+
+    def test_empty_run(self):
+        run_start = int(1e9)
+        events = self._build(self._peaks(n=0), run_start, [run_start + 10 * self.le])
+        self.assertEqual(len(events), 0)
+
+    def test_no_triggers(self):
+        peaks = self._peaks()
+        peaks['type'] = 1
+        run_end = strax.endtime(peaks)[-1] + 1
+        chunk_ends = np.linspace(peaks['time'][0], run_end, 5)[1:].astype(np.int64)
+        events = self._build(peaks, peaks['time'][0], chunk_ends)
+        self.assertEqual(len(events), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
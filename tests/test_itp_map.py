@@ -0,0 +1,54 @@
+import numpy as np
+
+import amstrax
+
+
+def _linear_map(limits):
+    """A map of a linear function, which multilinear interpolation reproduces exactly"""
+    axes = [np.linspace(*limit) for limit in limits]
+    grid = np.meshgrid(*axes, indexing='ij')
+    values = 1 + sum((dim_i + 2) * g for dim_i, g in enumerate(grid))
+    names = ['x', 'y', 'z'][:len(limits)]
+    return {'coordinate_system': [[name, list(limit)] for name, limit in zip(names, limits)],
+            'map': values.tolist()}
+
+
+def test_regular_grid_map():
+    rng = np.random.default_rng(0)
+    limits = [(-5, 5, 11), (0, 2, 3), (-50, 0, 26)]
+    for n_dim in [1, 2, 3]:
+        itp_map = amstrax.RegularGridMap(_linear_map(limits[:n_dim]))
+        points = [rng.uniform(low, high, 100) for low, high, _ in limits[:n_dim]]
+        expected = 1 + sum((dim_i + 2) * p for dim_i, p in enumerate(points))
+        np.testing.assert_allclose(itp_map(*points), expected)
+
+    # Outside of the map the value at the edge is used, NaN gives NaN
+    itp_map = amstrax.RegularGridMap(_linear_map(limits[:1]))
+    np.testing.assert_allclose(itp_map(np.array([-10., 10., np.nan])), [-9., 11., np.nan])
+
+    np.testing.assert_array_equal(amstrax.RegularGridMap.constant(2.)(), [2.])
+
+
+def test_load_map(tmp_path, monkeypatch):
+    """Map files are fetched once and then memory-mapped from the local cache"""
+    map_data = _linear_map([(-5, 5, 11), (0, 2, 3)])
+    fetched = []
+
+    def get_correction(file_name, branch):
+        fetched.append(file_name)
+        return map_data
+
+    monkeypatch.setenv(amstrax.MAP_CACHE_DIR_ENV, str(tmp_path))
+    monkeypatch.setattr(amstrax, 'get_correction', get_correction)
+    monkeypatch.setattr(amstrax.itp_map, '_loaded_maps', dict())
+
+    itp_map = amstrax.load_map('test_map_v0.json')
+    assert amstrax.load_map('test_map_v0.json') is itp_map
+    # As if in a new job
+    monkeypatch.setattr(amstrax.itp_map, '_loaded_maps', dict())
+    cached_map = amstrax.load_map('test_map_v0.json')
+    assert fetched == ['test_map_v0.json']
+
+    x, y = np.array([-4.5, 0.3]), np.array([1.5, 0.1])
+    np.testing.assert_allclose(cached_map(x, y), amstrax.RegularGridMap(map_data)(x, y))
+    np.testing.assert_allclose(cached_map(x, y), itp_map(x, y))
@@ -0,0 +1,74 @@
+import pytest
+
+import amstrax
+from amstrax import rundb
+
+
+class FakeTunnel:
+    started = []
+
+    def __init__(self, daq_host, **kwargs):
+        self.is_active = False
+        self.tunnel_is_up = dict()
+        self.local_bind_port = 40000 + len(self.started)
+
+    def start(self):
+        self.started.append(self)
+        self.is_active = True
+        self.tunnel_is_up = {('127.0.0.1', self.local_bind_port): True}
+
+    def check_tunnels(self):
+        pass
+
+    def stop(self):
+        self.is_active = False
+
+
+@pytest.fixture
+def connection(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    for key, value in dict(DAQ_PASSWORD='pw', DAQ_HOST='daq', DAQ_USER='xams',
+                           MONGO_USER='user', MONGO_PASSWORD='pw', MONGO_PORT='27017').items():
+        monkeypatch.setenv(key, value)
+    monkeypatch.setattr(rundb, 'SSHTunnelForwarder', FakeTunnel)
+    monkeypatch.setattr(FakeTunnel, 'started', [])
+    monkeypatch.setattr(rundb, '_configs', dict())
+    monkeypatch.setattr(rundb, '_tunnels', dict())
+    monkeypatch.setattr(rundb, '_clients', dict())
+    monkeypatch.setattr(rundb, '_retired_clients', [])
+    yield
+    amstrax.close_mongo_clients()
+
+
+def test_client_is_reused(connection, monkeypatch):
+    client = amstrax.get_mongo_client()
+    assert amstrax.get_mongo_client() is client
+    assert amstrax.get_mongo_collection().database.client is client
+    assert len(FakeTunnel.started) == 1
+
+    # The configuration is only read once
+    monkeypatch.delenv('DAQ_PASSWORD')
+    assert amstrax.get_mongo_client() is client
+
+
+def test_tunnel_reconnects(connection, monkeypatch):
+    client = amstrax.get_mongo_client()
+    monkeypatch.setattr(rundb, 'TUNNEL_CHECK_INTERVAL', 0)
+    assert amstrax.get_mongo_client() is client
+
+    closed = []
+    monkeypatch.setattr(type(client), 'close', lambda self: closed.append(self))
+    FakeTunnel.started[0].is_active = False
+    new_client = amstrax.get_mongo_client()
+    assert len(FakeTunnel.started) == 2
+    assert new_client is not client
+    assert amstrax.get_mongo_collection().database.client is new_client
+    # Callers may still hold the old client, it is closed after a grace period
+    assert not closed
+    assert amstrax.get_mongo_client() is new_client
+    assert not closed
+    monkeypatch.setattr(rundb, 'RETIRED_CLIENT_GRACE', -1)
+    assert amstrax.get_mongo_client() is new_client
+    assert closed == [client]
+    amstrax.close_mongo_clients()
+    assert closed == [client, new_client]
@@ -0,0 +1,33 @@
+import unittest
+
+import amstrax
+
+
+class TestNumbaCache(unittest.TestCase):
+    """
+    Kernels that are compiled without cache=True are compiled again by
+    every job, make sure that does not creep back in.
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.st = amstrax.contexts.xams(init_rundb=False)
+        cls.kernels = amstrax.numba_kernels(cls.st._plugin_class_registry.values())
+
+    def test_found_kernels(self):
+        self.assertIn('amstrax.plugins.peaks.peak_basics.PeakBasics.find_n_competing',
+                      self.kernels)
+
+    def test_kernels_are_cacheable(self):
+        not_cacheable = [name for name, kernel in self.kernels.items()
+                         if not amstrax.is_cacheable(kernel)]
+        self.assertFalse(not_cacheable, f'Use cache=True for {not_cacheable}')
+
+    def test_warmup_covers_kernels(self):
+        warmed_up = [kernel for kernel, _ in amstrax.numba_warmup._warmup_calls(self.st, '000000')]
+        missing = [name for name, kernel in self.kernels.items() if kernel not in warmed_up]
+        self.assertFalse(missing, f'Add a warm-up for {missing}')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import numpy as np
+
+import amstrax
+
+
+def _brute_force_match(times, other_times, max_delay):
+    result = np.full(len(times), -1, dtype=np.int64)
+    for i, t in enumerate(times):
+        delays = np.abs(other_times - t)
+        if len(delays) and delays.min() <= max_delay:
+            # Earliest of the closest in case of a tie
+            candidates = np.flatnonzero(delays == delays.min())
+            result[i] = candidates[np.argmin(other_times[candidates])]
+    return result
+
+
+def test_match_nearest_in_time():
+    """The indexed matching should agree with a brute force search"""
+    rng = np.random.default_rng(42)
+    match = amstrax.PeakSiPMMatch.match_nearest_in_time
+    for n, m in [(0, 10), (10, 0), (100, 50), (500, 2000)]:
+        times = np.sort(rng.integers(0, 100_000, n)).astype(np.int64)
+        other_times = rng.integers(0, 100_000, m).astype(np.int64)
+        for max_delay in [0, 50, 1000]:
+            np.testing.assert_array_equal(
+                match(times, other_times, max_delay),
+                _brute_force_match(times, other_times, max_delay),
+            )
@@ -0,0 +1,42 @@
+import numpy as np
+import strax
+
+import amstrax
+from amstrax.plugins.peaks.peaks import LIGHT_DECILES, LIGHT_WIDTHS
+
+
+def _random_peaks(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    peaks = np.zeros(n, dtype=strax.peak_dtype(n_channels=2))
+    peaks['dt'] = rng.integers(1, 100, n)
+    peaks['length'] = rng.integers(1, peaks['data'].shape[1], n)
+    for p in peaks:
+        p['data'][:p['length']] = rng.exponential(10, p['length'])
+    peaks['area'] = peaks['data'].sum(axis=1)
+    return peaks
+
+
+def test_full_widths():
+    """The widths should follow the definition of strax.compute_widths"""
+    peaks = _random_peaks()
+    amstrax.compute_peak_widths(peaks, 'full')
+
+    fractions = np.linspace(0, 1, 21)
+    fr_times = strax.index_of_fraction(peaks, fractions) * peaks['dt'].reshape(-1, 1)
+    np.testing.assert_allclose(peaks['width'], fr_times[:, 10:] - fr_times[:, 10::-1], atol=1e-2)
+    np.testing.assert_allclose(peaks['area_decile_from_midpoint'],
+                               fr_times[:, ::2] - fr_times[:, [10]], atol=1e-2)
+
+
+def test_light_widths():
+    """The light mode should only compute (the same) widths used in peak_basics"""
+    full = _random_peaks()
+    light = full.copy()
+    amstrax.compute_peak_widths(full, 'full')
+    amstrax.compute_peak_widths(light, 'light')
+
+    for field, used in (('width', LIGHT_WIDTHS),
+                        ('area_decile_from_midpoint', LIGHT_DECILES)):
+        unused = np.setdiff1d(np.arange(full[field].shape[1]), used)
+        np.testing.assert_array_equal(light[field][:, used], full[field][:, used])
+        assert np.all(np.isnan(light[field][:, unused]))
@@ -0,0 +1,155 @@
+import datetime
+import socket
+
+import bson
+import pytest
+import strax
+
+import amstrax
+from amstrax.auto_processing_new import db_utils
+
+
+class FakeCollection:
+    """Enough of a pymongo collection for RunCatalog.sync"""
+
+    def __init__(self):
+        self.docs = []
+        self.n_queries = 0
+
+    def add_run(self, number, **fields):
+        doc = dict(dict(_id=bson.ObjectId(), number=number, name=f'{number:06d}', data=[]), **fields)
+        self.docs.append(doc)
+        return doc
+
+    def find(self, query, projection=None, batch_size=None):
+        self.n_queries += 1
+        return [self._project(doc, projection) for doc in self.docs if _matches(doc, query)]
+
+    @staticmethod
+    def _project(doc, projection):
+        result = dict(_id=doc['_id'])
+        for field in projection:
+            if field.startswith('data.'):
+                result.setdefault('data', [dict() for _ in doc.get('data', [])])
+                for datum, projected in zip(doc.get('data', []), result['data']):
+                    if field[5:] in datum:
+                        projected[field[5:]] = datum[field[5:]]
+            elif field in doc:
+                result[field] = doc[field]
+        if 'data' in result and 'data' not in doc:
+            del result['data']
+        return result
+
+
+def _matches(doc, query):
+    """Match the queries of RunCatalog.sync"""
+    if '$or' in query:
+        return any(_matches(doc, q) for q in query['$or'])
+    for field, condition in query.items():
+        values = _values(doc, field)
+        if '$in' in condition and not any(value in condition['$in'] for value in values):
+            return False
+        if '$gt' in condition and not any(value > condition['$gt'] for value in values):
+            return False
+    return True
+
+
+def _values(doc, field):
+    """Values of a (dotted) field of doc, like MongoDB looks them up in arrays"""
+    values = [doc]
+    for part in field.split('.'):
+        found = [value.get(part) for value in values if isinstance(value, dict)]
+        values = [v for value in found for v in (value if isinstance(value, list) else [value])]
+    return [value for value in values if value is not None]
+
+
+@pytest.fixture
+def rundb():
+    collection = FakeCollection()
+    lineage = dict(peaks=('Peaks', '0.0.1', dict()))
+    events_hash = strax.DataKey('000000', 'events', dict(events=('Events', '0.0.1', dict()))).lineage_hash
+    for number in range(3):
+        collection.add_run(number, mode='test', data=[
+            dict(type='peaks', host='stbc', location=f'/data/{number:06d}-peaks',
+                 protocol='FileSytemBackend', meta=dict(lineage=lineage)),
+            # As registered by the processing scripts
+            dict(type='events', host='stbc', location='/processed',
+                 lineage_hash=events_hash)])
+    return collection, lineage
+
+
+def test_run_catalog(rundb, tmp_path):
+    collection, lineage = rundb
+    path = str(tmp_path / 'runs.sqlite')
+    catalog = amstrax.RunCatalog(path)
+    assert catalog.sync(collection) == 3
+
+    # Only new and changed runs are fetched, and the _ids of all runs
+    collection.add_run(3, mode='test')
+    collection.docs[0]['end'] = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    collection.docs[1]['tags'] = [dict(name='bad')]
+    collection.n_queries = 0
+    assert catalog.sync(collection) == 2
+    assert collection.n_queries == 2
+    assert catalog.run_doc(0)['end'] is not None
+    # Edits that do not change a time are found by comparing the fingerprints
+    assert 'tags' not in catalog.run_doc(1)
+    assert catalog.sync(collection, full=True) == 1
+    assert catalog.run_doc(1)['tags'] == [dict(name='bad')]
+    assert catalog.sync(collection, full=True) == 0
+
+    frontend = amstrax.RunCatalogFrontend(path, hosts='stbc')
+    assert frontend.run_metadata('000003', projection=['mode']) == dict(mode='test')
+    with pytest.raises(strax.DataNotAvailable):
+        frontend.run_metadata('000004')
+
+    peaks = strax.DataKey('000001', 'peaks', lineage)
+    assert frontend._find(peaks, False, False, None, None) == ('FileSytemBackend', '/data/000001-peaks')
+    events = strax.DataKey('000001', 'events', dict(events=('Events', '0.0.1', dict())))
+    assert frontend._find(events, False, False, None, None)[1] == f'/processed/{events}'
+    assert frontend._list_available(peaks, False, None, None) == ['000000', '000001', '000002']
+
+    frontend.available_hosts = ['dcache']
+    with pytest.raises(strax.DataNotAvailable):
+        frontend._find(peaks, False, False, None, None)
+
+    # Removed runs are removed on every sync, removed data entries once the
+    # fingerprints are compared again
+    del collection.docs[0]
+    collection.docs[0]['data'] = collection.docs[0]['data'][1:]
+    catalog.sync(collection)
+    assert catalog.run_doc(0) is None
+    assert len(catalog.run_doc(1)['data']) == 2
+    catalog.full_sync_interval = 0
+    assert catalog.sync(collection) == 1
+    assert len(catalog.run_doc(1)['data']) == 1
+    frontend.available_hosts = ['stbc']
+    assert frontend._list_available(peaks, False, None, None) == ['000002']
+
+
+def test_processing_hosts(rundb, tmp_path, monkeypatch):
+    """Data registered by jobs on any stoomboot node is found on the others"""
+    path = str(tmp_path / 'runs.sqlite')
+    amstrax.RunCatalog(path).sync(rundb[0])
+    monkeypatch.setattr(socket, 'gethostname', lambda: 'wn-a7-12')
+    monkeypatch.setattr(socket, 'getfqdn', lambda: 'wn-a7-12.nikhef.nl')
+    frontend = amstrax.RunCatalogFrontend(path)
+    assert frontend.available_hosts == ['wn-a7-12.nikhef.nl', 'wn', 'stbc']
+    peaks = strax.DataKey('000001', 'peaks', rundb[1])
+    assert frontend._find(peaks, False, False, None, None)[1] == '/data/000001-peaks'
+
+
+def test_run_doc_fallback(rundb, tmp_path, monkeypatch):
+    """Jobs read runs that are not in the catalog (yet) from the rundb"""
+    collection, _ = rundb
+    path = str(tmp_path / 'runs.sqlite')
+    amstrax.RunCatalog(path).sync(collection)
+    collection.add_run(3, mode='new')
+    collection.find_one = lambda query: next(
+        (doc for doc in collection.docs if doc['number'] == query['number']), None)
+    monkeypatch.setattr(db_utils, 'get_runsdb', lambda: collection)
+
+    assert db_utils.get_run_doc('000001', run_catalog=path)['mode'] == 'test'
+    assert db_utils.get_run_doc('000003', run_catalog=path)['mode'] == 'new'
+    with pytest.raises(ValueError, match='000004'):
+        db_utils.get_run_doc('000004', run_catalog=path)
@@ -0,0 +1,115 @@
+import datetime
+import socket
+
+import bson
+import pytest
+import strax
+
+import amstrax
+from amstrax import rundb
+
+
+class FakeCollection:
+    """The part of a pymongo collection that RunDB uses, counting the queries"""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.n_queries = 0
+
+    def find_one(self, query, projection=None):
+        self.n_queries += 1
+        for doc in self.docs:
+            if all(doc.get(field) == value for field, value in query.items()):
+                return dict(doc)
+        return None
+
+    def count_documents(self, query):
+        return len([doc for doc in self.docs if _matches(doc, query)])
+
+    def find(self, query, projection=None, sort=None, limit=0):
+        self.n_queries += 1
+        docs = sorted((doc for doc in self.docs if _matches(doc, query)), key=lambda d: d['_id'])
+        if projection == ['_id']:
+            docs = [dict(_id=doc['_id']) for doc in docs]
+        return [dict(doc) for doc in docs[:limit or None]]
+
+    def find_one_and_update(self, query, update):
+        doc = next(doc for doc in self.docs if doc['_id'] == query['_id'])
+        doc['data'] = doc['data'] + [update['$push']['data']]
+
+
+def _matches(doc, query):
+    """Match the queries of RunDB._scan_runs"""
+    if '$and' in query:
+        return all(_matches(doc, q) for q in query['$and'])
+    if '$or' in query:
+        return any(_matches(doc, q) for q in query['$or'])
+    return all(doc.get(field) is not None and doc[field] > condition['$gt']
+               for field, condition in query.items())
+
+
+@pytest.fixture
+def frontend(monkeypatch, tmp_path):
+    lineage = dict(peaks=('Peaks', '0.0.1', dict(threshold=(1, 2))))
+    docs = [dict(_id=bson.ObjectId(), number=i, mode='test',
+                 data=[dict(type='peaks', host=socket.getfqdn(), protocol='FileSytemBackend',
+                            location=f'/data/{i:06d}-peaks', meta=dict(lineage=lineage))])
+            for i in range(3)]
+    collection = FakeCollection(docs)
+    monkeypatch.setattr(rundb, 'get_mongo_client', lambda: {'db': {'runs': collection}})
+    monkeypatch.setenv(amstrax.RUN_SCAN_CACHE_DIR_ENV, str(tmp_path / 'scans'))
+    frontend = amstrax.RunDB(mongo_dbname='db', mongo_collname='runs', runid_field='number',
+                             new_data_path=str(tmp_path), readonly=False)
+    return frontend, collection, lineage
+
+
+def test_run_doc_cache(frontend):
+    frontend, collection, lineage = frontend
+    key = strax.DataKey('000001', 'peaks', lineage)
+    other_key = strax.DataKey('000001', 'events', dict(events=('Events', '0.0.1', dict())))
+
+    assert frontend._find(key, False, False, None, None) == ('FileSytemBackend', '/data/000001-peaks')
+    with pytest.raises(strax.DataNotAvailable):
+        frontend._find(other_key, False, False, None, None)
+    assert collection.n_queries == 1
+
+    # Writing registers the data and invalidates the cache
+    frontend._find(other_key, True, False, None, None)
+    assert frontend._find(other_key, False, False, None, None)[1].endswith(str(other_key))
+
+    assert frontend.run_metadata('000002')['mode'] == 'test'
+    frontend.run_metadata('000002')['mode'] = 'changed'
+    assert frontend.run_metadata('000002')['mode'] == 'test'
+
+    frontend.cache_ttl = 0
+    n_queries = collection.n_queries
+    frontend.run_metadata('000002')
+    assert collection.n_queries == n_queries + 1
+
+
+def test_incremental_scan(frontend):
+    frontend, collection, _ = frontend
+    frontend.scan_cache = True
+    frontend.scan_page_size = 2
+    fields = ['number', 'mode', 'end']
+    assert [doc['number'] for doc in frontend._scan_runs(fields)] == [0, 1, 2]
+    # Two pages and the query that finds there are no more
+    assert collection.n_queries == 2
+
+    # Only the new and the changed run are fetched
+    collection.docs.append(dict(_id=bson.ObjectId(), number=3, mode='test', data=[]))
+    collection.docs[0]['end'] = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    collection.n_queries = 0
+    frontend.scan_page_size = 3
+    docs = list(frontend._scan_runs(fields))
+    assert [doc['number'] for doc in docs] == [0, 1, 2, 3]
+    assert docs[0]['end'] is not None
+    # The list of _ids, to drop removed runs, and the changed runs
+    assert collection.n_queries == 2
+
+    # Other edits are seen with the next full scan, which is due now
+    collection.docs[2]['mode'] = 'edited'
+    del collection.docs[1]
+    assert [doc['mode'] for doc in frontend._scan_runs(fields)] == ['test', 'test', 'test']
+    frontend.full_scan_interval = 0
+    assert [doc['mode'] for doc in frontend._scan_runs(fields)] == ['test', 'edited', 'test']
@@ -0,0 +1,145 @@
+import datetime
+import tempfile
+import unittest
+
+import numpy as np
+import strax
+
+import amstrax
+
+
+class TestSuperruns(unittest.TestCase):
+
+    def test_subrun_ids(self):
+        name = amstrax.contexts.superrun_name('8', 11)
+        self.assertEqual(name, '_000008_000011')
+        self.assertEqual(amstrax.contexts.subrun_ids(name),
+                         ('000008', '000009', '000010', '000011'))
+        self.assertEqual(amstrax.contexts.subrun_ids('000008'), ('000008',))
+
+    def test_only_consecutive_runs(self):
+        st = amstrax.contexts.xams(init_rundb=False)
+        with self.assertRaises(ValueError):
+            amstrax.contexts.define_superrun(st, ['000008', '000010'])
+
+    def test_correction_of_superrun(self):
+        config = amstrax.XAMSConfig(default=None)
+        config.name, config.filename = 'elife', 'elife_v0.json'
+        corrections = {'000001-000010': 1000, '000011-000020': 2000}
+        self.assertEqual(config.find_correction_value(corrections, '000002_000005'), 1000)
+        with self.assertRaises(ValueError):
+            config.find_correction_value(corrections, '000009_000012')
+
+
+class TestSuperrunProcessing(unittest.TestCase):
+    """st.make on a superrun gives the same events as on its runs"""
+
+    run_ids = ('000010', '000011', '000012')
+    n_chunks = 4
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.st = amstrax.contexts.xams(init_rundb=False)
+        self.st.storage = [strax.DataDirectory(self.tempdir.name, provide_run_metadata=True)]
+
+        # Runs of 2 s, with 100 us between them
+        self.starts = {run_id: int(1e18) + run_i * int(2.0001e9)
+                       for run_i, run_id in enumerate(self.run_ids)}
+        self.ends = {run_id: start + int(2e9) for run_id, start in self.starts.items()}
+        for run_id in self.run_ids:
+            self.st.storage[0].write_run_metadata(run_id, dict(
+                start=_datetime(self.starts[run_id]), end=_datetime(self.ends[run_id])))
+        self._register_fake_peaks()
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def _register_fake_peaks(self):
+        dtypes = {d: self.st.get_single_plugin(self.run_ids[0], d).dtype_for(d)
+                  for d in ['peaks', 'peak_basics', 'peak_positions']}
+        starts, ends, n_chunks = self.starts, self.ends, self.n_chunks
+
+        class RunPeaks(strax.Plugin):
+            """Peaks of one run, with triggers at its start and end"""
+            depends_on = ()
+            provides = 'run_peaks'
+            data_kind = 'run_peaks'
+            rechunk_on_save = False
+
+            def infer_dtype(self):
+                return strax.merged_dtype(list(dtypes.values()))
+
+            def is_ready(self, chunk_i):
+                return chunk_i < n_chunks
+
+            def source_finished(self):
+                return True
+
+            def compute(self, chunk_i):
+                start, end = starts[self.run_id], ends[self.run_id]
+                rng = np.random.default_rng(int(self.run_id))
+                time = np.sort(rng.integers(start, end - 20, 4000))
+                time[0], time[-1] = start, end - 20
+                peak_type = np.where(rng.random(len(time)) < 0.5, 2, 1)
+                area = rng.exponential(100, len(time))
+                peak_type[[0, -1]], area[[0, -1]] = 2, 1000
+
+                edges = start + (end - start) * np.arange(n_chunks + 1) // n_chunks
+                in_chunk = (time >= edges[chunk_i]) & (time < edges[chunk_i + 1])
+                result = np.zeros(in_chunk.sum(), self.dtype)
+                result['time'] = time[in_chunk]
+                result['length'], result['dt'] = 10, 1
+                result['endtime'] = result['time'] + 10
+                result['center_time'] = result['time'] + 5
+                result['type'] = peak_type[in_chunk]
+                result['area'] = area[in_chunk]
+                return self.chunk(start=edges[chunk_i], end=edges[chunk_i + 1], data=result)
+
+        class Peaks(strax.Plugin):
+            """The peak data types, for runs and superruns"""
+            depends_on = 'run_peaks'
+            provides = tuple(dtypes)
+            data_kind = {data_type: 'peaks' for data_type in dtypes}
+            allow_superrun = True
+            rechunk_on_save = False
+
+            def infer_dtype(self):
+                return dtypes
+
+            def compute(self, run_peaks):
+                result = dict()
+                for data_type, dtype in dtypes.items():
+                    result[data_type] = np.zeros(len(run_peaks), dtype=dtype)
+                    for field in result[data_type].dtype.names:
+                        result[data_type][field] = run_peaks[field]
+                return result
+
+        self.st.register(RunPeaks)
+        self.st.register(Peaks)
+
+    def test_events_of_superrun(self):
+        per_run = [self.st.get_array(run_id, 'event_basics', progress_bar=False)
+                   for run_id in self.run_ids]
+        name = amstrax.contexts.define_superrun(self.st, self.run_ids)
+        self.st.make(name, 'event_basics', progress_bar=False)
+        self.assertTrue(self.st.is_stored(name, 'events'))
+        self.assertTrue(self.st.is_stored(name, 'event_basics'))
+
+        events = self.st.get_array(name, 'event_basics', progress_bar=False)
+        expected = np.concatenate(per_run)
+        for field in ['time', 'endtime', 's1_area', 's2_area', 'drift_time']:
+            np.testing.assert_array_equal(events[field], expected[field])
+        self.assertTrue(np.all(np.diff(events['event_number']) > 0))
+
+        # Events are clipped to their run, including those triggered at its edges
+        for run_id, run_events in zip(self.run_ids, per_run):
+            self.assertEqual(run_events['time'][0], self.starts[run_id])
+            self.assertEqual(run_events['endtime'][-1], self.ends[run_id])
+
+
+def _datetime(time):
+    return datetime.datetime.fromtimestamp(time / 1e9, tz=datetime.timezone.utc)
+
+
+if __name__ == '__main__':
+    unittest.main()